@@ -1,20 +1,186 @@
+import os
+import re
+import json
 import time
 import logging
 import asyncio
-from typing import List
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
 
-from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 from llama_index.core.llms import ChatMessage
-from llama_index.llms.ollama import Ollama
+from ollama import ResponseError
+
+from backends import BackendRegistry, is_host_failure
+from context_window import ContextWindow, TokenCounter
+from metrics import ChatMetrics
+from model_manager import ModelManager
+from ollama_pool import OllamaClientPool
+from response_cache import CacheLookup, ResponseCache
+from sessions import SessionStore
+from static_assets import PrecompressedStatic
+from singleflight import SingleFlight
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, ModelScheduler, QueueFullError
+from streaming import FlowWindow, GenerationStats, TokenStream
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="Local LLM Chat Backend")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Several inference hosts may be listed; requests are balanced across them
+OLLAMA_HOSTS = [h.strip().rstrip("/") for h in os.getenv("OLLAMA_HOSTS", OLLAMA_BASE_URL).split(",") if h.strip()]
+PRELOAD_MODELS = [m.strip() for m in os.getenv("PRELOAD_MODELS", "llama3,phi3,mistral").split(",") if m.strip()]
+# Models loaded into Ollama at startup and pinned there (unloaded only under memory pressure)
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "llama3").split(",") if m.strip()]
+# WebSocket streaming: per-connection queue size and token coalescing window
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+WS_COALESCE_MS = float(os.getenv("WS_COALESCE_MS", "25"))
+WS_MAX_FRAME_CHARS = int(os.getenv("WS_MAX_FRAME_CHARS", "1024"))
+# Multiplexed /ws/mux: streams per socket, initial per-stream credit (frames) and heartbeat interval
+WS_MAX_STREAMS = int(os.getenv("WS_MAX_STREAMS", "8"))
+WS_STREAM_WINDOW = int(os.getenv("WS_STREAM_WINDOW", "16"))
+WS_MAX_STREAM_WINDOW = int(os.getenv("WS_MAX_STREAM_WINDOW", "1024"))
+WS_HEARTBEAT_SEC = float(os.getenv("WS_HEARTBEAT_SEC", "20"))
+
+backends = BackendRegistry(
+    OLLAMA_HOSTS,
+    interval=float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10")),
+    cold_penalty=int(os.getenv("OLLAMA_COLD_PENALTY", "4")),
+)
+
+
+def _parse_model_map(spec: str) -> Dict[str, str]:
+    """`llama3=8192,phi3=4096` -> {"llama3": "8192", "phi3": "4096"}."""
+    pairs = [item.split("=", 1) for item in spec.split(",") if "=" in item]
+    return {k.strip(): v.strip() for k, v in pairs}
+
+
+# Context windows per model (sent to Ollama as num_ctx); history beyond the budget is summarized
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "256"))
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "")
+
+
+async def _summarize(model: str, text: str) -> str:
+    model = CONTEXT_SUMMARY_MODEL or model
+    backend = backends.choose(model)
+    client = pool.get(model, backend.url).async_client
+    prompt = (
+        "Summarize this conversation so it can continue without the original messages. "
+        "Keep names, facts, decisions and open questions; be brief.\n\n" + text
+    )
+    resp = await client.chat(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        options={"num_predict": CONTEXT_SUMMARY_TOKENS, "num_ctx": context.window(model)},
+        keep_alive=pool.keep_alive_for(model),
+    )
+    return resp["message"]["content"]
+
+
+CONTEXT_TOKEN_FACTORS = _parse_model_map(os.getenv("CONTEXT_TOKEN_FACTORS", "llama3=1.0,phi3=1.1,mistral=1.15"))
+CONTEXT_WINDOWS = _parse_model_map(os.getenv("CONTEXT_WINDOWS", "llama3=8192,phi3=4096,mistral=8192"))
+
+context = ContextWindow(
+    TokenCounter({k: float(v) for k, v in CONTEXT_TOKEN_FACTORS.items()}),
+    windows={k: int(v) for k, v in CONTEXT_WINDOWS.items()},
+    default_window=int(os.getenv("CONTEXT_DEFAULT_WINDOW", "4096")),
+    reserve=int(os.getenv("CONTEXT_RESERVE_TOKENS", "1024")),
+    summary_tokens=CONTEXT_SUMMARY_TOKENS,
+    summarize=_summarize if os.getenv("CONTEXT_SUMMARIZE", "1") != "0" else None,
+)
+
+
+# One long-lived client per model and host, shared by every request
+def _keep_alive(value: str):
+    """Ollama takes durations ("30m") or seconds; negative seconds mean forever."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+pool = OllamaClientPool(
+    base_url=OLLAMA_HOSTS[0],
+    request_timeout=120.0,
+    max_connections=int(os.getenv("OLLAMA_MAX_CONNECTIONS", "8")),
+    keep_alive=_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m")),
+    keep_alive_overrides={m: _keep_alive(os.getenv("OLLAMA_PINNED_KEEP_ALIVE", "-1")) for m in WARMUP_MODELS},
+    # num_ctx sent by each client: the same window the prompt budget is computed from
+    context_window_for=context.window,
+)
+
+# Warm-up, /models and unloading idle models when a host runs out of room
+model_manager = ModelManager(
+    backends,
+    client_for=lambda model, url: pool.get(model, url).async_client,
+    keep_alive_for=pool.keep_alive_for,
+    context_window_for=context.window,
+    warm_models=WARMUP_MODELS,
+    max_loaded=int(os.getenv("MAX_LOADED_MODELS", "0")),
+    memory_budget=int(float(os.getenv("MODEL_MEMORY_BUDGET_GB", "0")) * 1024**3),
+    idle_grace=float(os.getenv("MODEL_IDLE_GRACE", "60")),
+)
+
+# Admission control: per-model in-flight cap (per host) and bounded priority wait queue
+scheduler = ModelScheduler(
+    max_in_flight=int(os.getenv("MAX_IN_FLIGHT_PER_MODEL", "2")) * len(OLLAMA_HOSTS),
+    max_queue=int(os.getenv("MAX_QUEUE_PER_MODEL", "32")),
+)
+
+metrics = ChatMetrics(scheduler.stats)
+
+# Conversation history kept server-side; SESSION_DB enables SQLite persistence
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+    db_path=os.getenv("SESSION_DB") or None,
+)
+
+
+# In-flight generations, keyed like the exact cache tier (model + message hash);
+# each runs no further ahead of its slowest subscriber than one socket queue
+flights = SingleFlight(max_lag=WS_QUEUE_SIZE)
+
+
+# Optional embedding model for the semantic cache tier (e.g. nomic-embed-text)
+CACHE_EMBED_MODEL = os.getenv("CACHE_EMBED_MODEL", "")
+
+
+async def _embed(text: str) -> List[float]:
+    backend = backends.choose(CACHE_EMBED_MODEL)
+    client = pool.get(CACHE_EMBED_MODEL, backend.url).async_client
+    resp = await client.embed(model=CACHE_EMBED_MODEL, input=text, keep_alive=pool.keep_alive_for(CACHE_EMBED_MODEL))
+    return resp["embeddings"][0]
+
+
+# Completed responses for repeated prompts (exact tier + optional semantic tier)
+cache = ResponseCache(
+    ttl=float(os.getenv("CACHE_TTL", "600")),
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    embed=_embed if CACHE_EMBED_MODEL else None,
+    threshold=float(os.getenv("CACHE_SEMANTIC_THRESHOLD", "0.95")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool.preload(PRELOAD_MODELS, backends.urls)
+    static.scan()
+    await backends.start()
+    await model_manager.start()
+    await context.counter.start()
+    yield
+    await context.counter.stop()
+    await model_manager.stop()
+    await backends.stop()
+    await pool.aclose()
+    sessions.close()
+
+
+app = FastAPI(title="Local LLM Chat Backend", lifespan=lifespan)
 
 # Allow the SPA (likely served from file:// or localhost) to call the API
 app.add_middleware(
@@ -31,8 +197,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve SPA static files from ./frontend
-app.mount("/static", StaticFiles(directory="frontend"), name="static")
+# Serve the built SPA only (frontend/dist), with precompressed variants and cache headers
+static = PrecompressedStatic(
+    os.getenv("FRONTEND_DIST", "frontend/dist"),
+    index_max_age=int(os.getenv("STATIC_INDEX_MAX_AGE", "0")),
+    max_age=int(os.getenv("STATIC_MAX_AGE", "3600")),
+)
 
 
 
@@ -44,73 +214,433 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     model: str
+    # With a conversation_id, only the new turn; otherwise the full history
     messages: List[Message]
+    conversation_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     response: str
     duration: float
+    timings: Dict[str, Union[int, float]] = {}
+    conversation_id: Optional[str] = None
+    cached: Optional[str] = None  # "exact" or "semantic" when served from the cache
+    cold: Optional[bool] = None  # the model had to be loaded for this request
+
+
+class ConversationRequest(BaseModel):
+    model: Optional[str] = None
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "backends": backends.stats(),
+        "pool": pool.stats(),
+        "scheduler": scheduler.stats(),
+        "sessions": sessions.stats(),
+        "cache": cache.stats(),
+        "flights": flights.stats(),
+        "context": context.stats(),
+        "models": model_manager.stats(),
+        "static": static.stats(),
+    }
+
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-async def _call_ollama(model: str, messages: List[ChatMessage]) -> str:
-    """Run the Ollama chat stream in a thread and collect the full response."""
 
-    def run():
+@app.get("/models")
+async def list_models():
+    """Models pulled on the Ollama hosts, with where each one is currently loaded."""
+    return {"models": model_manager.models()}
+
+
+@app.post("/conversations")
+async def create_conversation(req: ConversationRequest):
+    session = await sessions.create(model=req.model)
+    return {"conversation_id": session.id}
+
+
+@app.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str):
+    session = await sessions.aget(conversation_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown conversation")
+    return {"conversation_id": session.id, "model": session.model, "messages": session.messages}
+
+
+@app.delete("/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str):
+    if not await sessions.delete(conversation_id):
+        raise HTTPException(status_code=404, detail="Unknown conversation")
+    return {"deleted": conversation_id}
+
+
+async def _history(conversation_id: Optional[str]) -> Optional[List[Dict[str, str]]]:
+    """Stored history for a conversation ([] when stateless, None when unknown)."""
+    if not conversation_id:
+        return []
+    session = await sessions.aget(conversation_id)
+    return None if session is None else session.messages
+
+
+def _to_chat_messages(msgs: List[Dict[str, str]]) -> List[ChatMessage]:
+    return [ChatMessage(role=m.get("role"), content=m.get("content")) for m in msgs]
+
+
+async def _astream_tokens(model: str, messages: List[ChatMessage], stats: GenerationStats) -> AsyncIterator[str]:
+    """Yield token deltas from the pooled client's async chat stream.
+
+    The request goes to the host chosen by the backend registry. If that host
+    fails before the first token (unreachable, or a 5xx), it is taken out of
+    rotation and the request is retried on the next best host. 4xx errors,
+    and any error after the first token, propagate.
+    """
+    tried = set()
+    while True:
+        backend = backends.choose(model, exclude=tried)
+        if backend is None:
+            raise RuntimeError(f"No Ollama backend could serve '{model}' (tried {sorted(tried)})")
+        tried.add(backend.url)
+        started = False
+        stats.cold = not backends.is_loaded(backend, model)
         try:
-            llm = Ollama(model=model, request_timeout=120.0)
-            resp = llm.stream_chat(messages)
-            response = ""
-            for r in resp:
-                # each r is expected to have a `delta` attribute
-                response += getattr(r, "delta", "")
-            logging.info(f"Model: {model}, Response length: {len(response)}")
-            return response
+            if stats.cold:
+                await model_manager.make_room(backend, model)
+            with backends.lease(backend, model):
+                resp = await pool.get(model, backend.url).astream_chat(messages)
+                eval_count = None
+                async for r in resp:
+                    token = getattr(r, "delta", "")
+                    if token:
+                        started = True
+                        stats.token()
+                        yield token
+                    if r.raw.get("done"):
+                        eval_count = r.raw.get("eval_count")
+                        stats.load_duration = (r.raw.get("load_duration") or 0) / 1e9
+            stats.finish(eval_count)
+            return
         except Exception as e:
-            logging.exception("Error calling Ollama")
-            raise
+            # Bad requests (e.g. a 404 for an unknown model) are not the host's fault
+            if started or not is_host_failure(e):
+                raise
+            backends.mark_failed(backend, e)
+            logging.warning(f"Ollama backend {backend.url} failed before first token, failing over: {e}")
+
+
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
 
-    return await asyncio.to_thread(run)
+
+async def _replay_tokens(text: str, stats: GenerationStats) -> AsyncIterator[str]:
+    """Yield a cached response word by word, so it streams like a live answer."""
+    for match in _TOKEN_RE.finditer(text):
+        stats.token()
+        yield match.group(0)
+    stats.finish()
+
+
+async def _generate(
+    lookup: CacheLookup, messages: List[Dict[str, str]], priority: int, stats: GenerationStats
+) -> AsyncIterator[str]:
+    """Token stream for one request: a cache replay, or a scheduled Ollama generation.
+
+    Concurrent requests with the same model and messages subscribe to one
+    generation. Each subscriber can leave on its own; upstream generation is
+    only cancelled when the last one does.
+    """
+    stats.cached = lookup.tier
+    if lookup.response is not None:
+        # Cache hits skip the scheduler but stream like live answers
+        stats.begin()
+        async for token in _replay_tokens(lookup.response, stats):
+            yield token
+        return
+
+    # Identical requests already generating share that stream instead of starting another
+    flight_stats = GenerationStats(start=stats.start)
+    flight, leader = flights.join(
+        lookup.key, lambda: _generate_live(lookup, messages, priority, flight_stats), state=flight_stats
+    )
+    if not leader:
+        metrics.coalesced.inc(lookup.model)
+    stats.begin()
+    async for token in flight.stream():
+        stats.token()
+        yield token
+    upstream: GenerationStats = flight.state
+    stats.queue_wait = upstream.queue_wait if leader else 0.0
+    if upstream.gen_start is not None:
+        stats.gen_start = max(stats.gen_start, upstream.gen_start)
+    stats.prompt_tokens = upstream.prompt_tokens
+    stats.cold = upstream.cold
+    stats.load_duration = upstream.load_duration
+    stats.tokens_saved = upstream.tokens_saved
+    stats.finish(upstream.tokens)
+
+
+async def _generate_live(
+    lookup: CacheLookup, messages: List[Dict[str, str]], priority: int, stats: GenerationStats
+) -> AsyncIterator[str]:
+    """A scheduled Ollama generation whose result is stored in the cache.
+
+    The cache key covers the full history; only the prompt sent to Ollama is
+    fitted to the model's context window. Summarizing runs inside the slot, so
+    it counts against the model's capacity like any other generation.
+    """
+    parts: List[str] = []
+    async with scheduler.slot(lookup.model, priority) as ticket:
+        messages, report = await context.fit(lookup.model, messages)
+        stats.prompt_tokens = report.prompt_tokens
+        stats.tokens_saved = report.tokens_saved
+        if report.tokens_saved:
+            metrics.context_tokens_saved.inc(lookup.model, amount=report.tokens_saved)
+            logging.info(
+                f"Model: {lookup.model}, context fitted {report.original_tokens} -> {report.prompt_tokens} tokens "
+                f"({report.summarized_messages} summarized, {report.dropped_messages} dropped)"
+            )
+        stats.begin(ticket.queue_wait)
+        async for token in _astream_tokens(lookup.model, _to_chat_messages(messages), stats):
+            parts.append(token)
+            yield token
+    cache.store(lookup, "".join(parts))
+
+
+async def _call_ollama(lookup: CacheLookup, messages: List[Dict[str, str]], stats: GenerationStats) -> str:
+    """Collect the full response for a batch request."""
+    try:
+        response = "".join([token async for token in _generate(lookup, messages, PRIORITY_BATCH, stats)])
+        logging.info(f"Model: {lookup.model}, Response length: {len(response)}")
+        return response
+    except QueueFullError:
+        raise
+    except Exception:
+        logging.exception("Error calling Ollama")
+        raise
 
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(req: ChatRequest):
     start = time.time()
+    stats = GenerationStats()
+    metrics.requests.inc(req.model, "chat")
+    history = await _history(req.conversation_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Unknown conversation")
     try:
-        messages = [ChatMessage(role=m.role, content=m.content) for m in req.messages]
-        response = await _call_ollama(req.model, messages)
+        turn = [m.model_dump() for m in req.messages]
+        lookup = await cache.lookup(req.model, history + turn)
+        response = await _call_ollama(lookup, history + turn, stats)
+        if req.conversation_id:
+            await sessions.append(req.conversation_id, turn + [{"role": "assistant", "content": response}], model=req.model)
+        metrics.observe(req.model, stats)
         duration = time.time() - start
-        return ChatResponse(response=response, duration=duration)
+        return ChatResponse(
+            response=response,
+            duration=duration,
+            timings=stats.timings(),
+            conversation_id=req.conversation_id,
+            cached=lookup.tier,
+            cold=stats.cold,
+        )
+    except QueueFullError as e:
+        metrics.errors.inc(req.model, "chat", "queue_full")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ResponseError as e:
+        if 400 <= e.status_code < 500:
+            metrics.errors.inc(req.model, "chat", "bad_request")
+            raise HTTPException(status_code=e.status_code, detail=e.error)
+        metrics.errors.inc(req.model, "chat", "upstream")
+        logging.error(f"Chat error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
+        metrics.errors.inc(req.model, "chat", "upstream")
         logging.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """Server-Sent Events variant of /chat for clients that cannot use WebSockets.
+
+    Emits `token` events ({token}) as generation progresses, then one `done` event
+    ({duration, timings: {queue_wait, ttft, generation, tokens, tokens_per_sec,
+    prompt_tokens, tokens_saved, load_duration}, cold, ...}) or an `error` event.
+    """
+    start = time.time()
+    stats = GenerationStats()
+    metrics.requests.inc(req.model, "chat_stream")
+    history = await _history(req.conversation_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Unknown conversation")
+    turn = [m.model_dump() for m in req.messages]
+    lookup = await cache.lookup(req.model, history + turn)
+    if lookup.response is None and not flights.running(lookup.key):
+        # Reject with a real 429 while we still can; later rejections become error events
+        try:
+            scheduler.check(req.model)
+        except QueueFullError as e:
+            metrics.errors.inc(req.model, "chat_stream", "queue_full")
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    async def events() -> AsyncIterator[str]:
+        parts: List[str] = []
+        finished = False
+        stream = TokenStream(_generate(lookup, history + turn, PRIORITY_BATCH, stats), maxsize=WS_QUEUE_SIZE).start()
+        try:
+            async for batch in stream.batches(window=WS_COALESCE_MS / 1000.0, max_chars=WS_MAX_FRAME_CHARS):
+                parts.append(batch)
+                yield _sse("token", {"token": batch})
+            finished = True
+            metrics.observe(req.model, stats)
+            duration = time.time() - start
+            yield _sse(
+                "done",
+                {
+                    "duration": duration,
+                    "timings": stats.timings(),
+                    "conversation_id": req.conversation_id,
+                    "cached": lookup.tier,
+                    "cold": stats.cold,
+                },
+            )
+        except QueueFullError as e:
+            finished = True
+            metrics.errors.inc(req.model, "chat_stream", "queue_full")
+            yield _sse("error", {"message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            finished = True
+            metrics.errors.inc(req.model, "chat_stream", "upstream")
+            logging.exception("Error streaming from Ollama")
+            yield _sse("error", {"message": str(e)})
+        finally:
+            if not finished:
+                # The client went away mid-stream
+                metrics.cancellations.inc(req.model, "chat_stream")
+            await stream.aclose()
+            if req.conversation_id and parts:
+                await sessions.append(req.conversation_id, turn + [{"role": "assistant", "content": "".join(parts)}], model=req.model)
+
+    # X-Accel-Buffering stops nginx-style proxies from holding back the stream
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
 # Serve index at root (must be defined at import time so Uvicorn sees it)
-@app.get("/", include_in_schema=False)
-async def root():
+@app.api_route("/", methods=["GET", "HEAD"], include_in_schema=False)
+async def root(request: Request):
     """Return the SPA index file."""
-    return FileResponse("frontend/dist/index.html")
+    return static.serve("index.html", request)
+
+
+async def _parse_turn(payload: dict):
+    """(model, conversation_id, turn, history) from an init/start payload; ValueError if invalid."""
+    model = payload.get("model")
+    if not model:
+        raise ValueError("missing model")
+    conversation_id = payload.get("conversation_id")
+    turn = [{"role": m.get("role"), "content": m.get("content")} for m in payload.get("messages", [])]
+    history = await _history(conversation_id)
+    if history is None:
+        raise ValueError(f"unknown conversation {conversation_id}")
+    return model, conversation_id, turn, history
+
+
+async def _wait_for_cancel(ws: WebSocket) -> bool:
+    """Read control frames until the client cancels (True) or disconnects (False)."""
+    while True:
+        try:
+            text = await ws.receive_text()
+        except WebSocketDisconnect:
+            return False
+        try:
+            if json.loads(text).get("action") == "cancel":
+                return True
+        except Exception:
+            pass
+
+
+async def _stream_to_socket(
+    send: Callable[[dict], Awaitable[None]],
+    model: str,
+    history: List[Dict[str, str]],
+    turn: List[Dict[str, str]],
+    conversation_id: Optional[str],
+    start: float,
+    endpoint: str = "ws_chat",
+):
+    """Serve from the cache or wait for a scheduler slot, then stream token frames through `send`."""
+    parts: List[str] = []
+    stats = GenerationStats()
+    stream = None
+    try:
+        lookup = await cache.lookup(model, history + turn)
+        stream = TokenStream(_generate(lookup, history + turn, PRIORITY_INTERACTIVE, stats), maxsize=WS_QUEUE_SIZE).start()
+        async for batch in stream.batches(window=WS_COALESCE_MS / 1000.0, max_chars=WS_MAX_FRAME_CHARS):
+            parts.append(batch)
+            await send({"type": "token", "token": batch})
+        metrics.observe(model, stats)
+        duration = time.time() - start
+        await send(
+            {
+                "type": "done",
+                "duration": duration,
+                "timings": stats.timings(),
+                "conversation_id": conversation_id,
+                "cached": lookup.tier,
+                "cold": stats.cold,
+            }
+        )
+    except QueueFullError as e:
+        metrics.errors.inc(model, endpoint, "queue_full")
+        await send({"type": "error", "message": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        metrics.errors.inc(model, endpoint, "upstream")
+        logging.exception("Error streaming from Ollama")
+        try:
+            await send({"type": "error", "message": str(e)})
+        except Exception:
+            pass
+    finally:
+        # Runs on cancellation too: this socket leaves its flight, and generation
+        # stops upstream (freeing the slot) unless other requests still share it
+        if stream is not None:
+            await stream.aclose()
+        if conversation_id and parts:
+            # Keep what the client has seen, including a cancelled partial answer
+            await sessions.append(conversation_id, turn + [{"role": "assistant", "content": "".join(parts)}], model=model)
 
 
 @app.websocket("/ws/chat")
 async def websocket_chat(ws: WebSocket):
     """WebSocket endpoint for streaming LLM tokens to the browser.
 
-    Client should first send a JSON message: { model: str, messages: [{role,content}, ...] }
-    Then server streams JSON messages { type: 'token', token: '...' } and finally { type: 'done', duration: float }.
+    Client should first send a JSON message: { model: str, messages: [{role,content}, ...], conversation_id?: str }
+    With a conversation_id (from POST /conversations) only the new turn is sent; the
+    server prepends the stored history and records the reply.
+    Then server streams JSON messages { type: 'token', token: '...' } and finally
+    { type: 'done', duration: float, timings: {queue_wait, ttft, generation, tokens, tokens_per_sec,
+    prompt_tokens, tokens_saved, load_duration}, cold: bool }.
+    Tokens arriving within WS_COALESCE_MS of each other are sent as one 'token' frame.
     Client may send { action: 'cancel' } to request cancellation.
     """
     await ws.accept()
-    import threading, json
+    metrics.websockets.inc("/ws/chat")
+    try:
+        await _websocket_chat(ws)
+    finally:
+        metrics.websockets.dec("/ws/chat")
 
-    cancel_event = threading.Event()
-    queue: asyncio.Queue = asyncio.Queue()
 
+async def _websocket_chat(ws: WebSocket):
     try:
         init_text = await ws.receive_text()
     except Exception:
@@ -118,85 +648,176 @@ async def websocket_chat(ws: WebSocket):
         return
 
     try:
-        init = json.loads(init_text)
-        model = init.get("model")
-        msgs = init.get("messages", [])
-        messages = [ChatMessage(role=m.get("role"), content=m.get("content")) for m in msgs]
+        model, conversation_id, turn, history = await _parse_turn(json.loads(init_text))
     except Exception as e:
         await ws.send_json({"type": "error", "message": f"Invalid init payload: {e}"})
         await ws.close()
         return
 
-    def llm_worker():
+    start = time.time()
+    metrics.requests.inc(model, "ws_chat")
+    sender = asyncio.create_task(_stream_to_socket(ws.send_json, model, history, turn, conversation_id, start))
+    listener = asyncio.create_task(_wait_for_cancel(ws))
+
+    try:
+        done, _ = await asyncio.wait([sender, listener], return_when=asyncio.FIRST_COMPLETED)
+        if listener in done:
+            # Cancelled or disconnected: drop out of the queue or stop generation
+            metrics.cancellations.inc(model, "ws_chat")
+            sender.cancel()
+            await asyncio.wait([sender])
+            if listener.result():
+                await ws.send_json({"type": "error", "message": "cancelled by client"})
+    except Exception:
+        pass
+    finally:
+        listener.cancel()
+        sender.cancel()
         try:
-            llm = Ollama(model=model, request_timeout=120.0)
-            resp = llm.stream_chat(messages)
-            for r in resp:
-                if cancel_event.is_set():
-                    break
-                token = getattr(r, "delta", "")
-                try:
-                    asyncio.run_coroutine_threadsafe(queue.put({"type": "token", "token": token}), asyncio.get_event_loop())
-                except Exception:
-                    break
-            try:
-                asyncio.run_coroutine_threadsafe(queue.put({"type": "done"}), asyncio.get_event_loop())
-            except Exception:
-                pass
-        except Exception as e:
-            try:
-                asyncio.run_coroutine_threadsafe(queue.put({"type": "error", "message": str(e)}), asyncio.get_event_loop())
-            except Exception:
-                pass
+            await ws.close()
+        except Exception:
+            pass
 
-    worker = threading.Thread(target=llm_worker, daemon=True)
-    worker.start()
 
-    start = time.time()
+@app.websocket("/ws/mux")
+def _frame_int(frame: dict, field: str, default: int, low: int, high: int) -> int:
+    """Integer `field` of a client frame, clamped to [low, high]; ValueError if it is not a number"""
+    value = frame.get(field)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{field} must be an integer") from None
+    return min(max(number, low), high)
+
+
+async def websocket_mux(ws: WebSocket):
+    """Multiplexed WebSocket: many concurrent generations on one long-lived socket.
+
+    Client frames:
+      { type: 'start', id, model, messages, conversation_id?, window? }  start stream `id`
+      { type: 'cancel', id }                                             stop one stream
+      { type: 'ack', id, frames }                                        grant `frames` more credit
+      { type: 'ping' } / { type: 'pong' }
+    Server frames carry the stream `id`: 'token', 'done' and 'error', shaped as on
+    /ws/chat. Each stream starts with `window` (default WS_STREAM_WINDOW, at most
+    WS_MAX_STREAM_WINDOW) credits and every token frame spends one; a stream out of
+    credit pauses until acked, without holding up the others. The server pings after
+    WS_HEARTBEAT_SEC of silence and closes the socket if the next interval passes
+    without any frame from the client.
+    """
+    await ws.accept()
+    metrics.websockets.inc("/ws/mux")
+    try:
+        await _websocket_mux(ws)
+    finally:
+        metrics.websockets.dec("/ws/mux")
 
+
+async def _websocket_mux(ws: WebSocket):
+    streams: Dict[str, asyncio.Task] = {}
+    windows: Dict[str, FlowWindow] = {}
+    models: Dict[str, str] = {}
+    send_lock = asyncio.Lock()
+
+    async def send(frame: dict):
+        async with send_lock:
+            await ws.send_json(frame)
+
+    async def run_stream(sid: str, model: str, history, turn, conversation_id, window: FlowWindow):
+        async def send_frame(frame: dict):
+            if frame["type"] == "token":
+                await window.acquire()
+            await send({"id": sid, **frame})
+
+        try:
+            await _stream_to_socket(send_frame, model, history, turn, conversation_id, time.time(), endpoint="ws_mux")
+        finally:
+            streams.pop(sid, None)
+            windows.pop(sid, None)
+            models.pop(sid, None)
+
+    async def stop(sid: str) -> bool:
+        task = streams.get(sid)
+        if task is None:
+            return False
+        metrics.cancellations.inc(models[sid], "ws_mux")
+        task.cancel()
+        await asyncio.wait([task])
+        return True
+
+    awaiting_pong = False
     try:
         while True:
-            send_task = asyncio.create_task(queue.get())
-            recv_task = asyncio.create_task(ws.receive_text())
-            done, pending = await asyncio.wait([send_task, recv_task], return_when=asyncio.FIRST_COMPLETED)
-
-            if send_task in done:
-                msg = send_task.result()
-                if not recv_task.done():
-                    recv_task.cancel()
-                if msg.get("type") == "token":
-                    await ws.send_json({"type": "token", "token": msg.get("token", "")})
-                elif msg.get("type") == "done":
-                    duration = time.time() - start
-                    await ws.send_json({"type": "done", "duration": duration})
-                    break
-                elif msg.get("type") == "error":
-                    await ws.send_json({"type": "error", "message": msg.get("message")})
+            try:
+                text = await asyncio.wait_for(ws.receive_text(), timeout=WS_HEARTBEAT_SEC)
+            except asyncio.TimeoutError:
+                if awaiting_pong:
+                    logging.info("Closing /ws/mux connection after a missed heartbeat")
                     break
-            elif recv_task in done:
-                recv_text = recv_task.result()
-                try:
-                    ctrl = json.loads(recv_text)
-                    if ctrl.get("action") == "cancel":
-                        cancel_event.set()
-                        await ws.send_json({"type": "error", "message": "cancelled by client"})
-                        break
-                except Exception:
-                    pass
+                awaiting_pong = True
+                await send({"type": "ping"})
+                continue
+            awaiting_pong = False
 
-            for t in pending:
-                t.cancel()
-
-    except Exception:
-        cancel_event.set()
+            try:
+                frame = json.loads(text)
+                kind = frame.get("type")
+                sid = str(frame.get("id", ""))
+            except Exception:
+                await send({"type": "error", "message": "invalid frame"})
+                continue
+
+            if kind == "ping":
+                await send({"type": "pong"})
+            elif kind == "ack":
+                if sid in windows:
+                    try:
+                        frames = _frame_int(frame, "frames", 1, 0, WS_MAX_STREAM_WINDOW)
+                    except ValueError as e:
+                        await send({"id": sid, "type": "error", "message": f"Invalid ack frame: {e}"})
+                        continue
+                    windows[sid].grant(frames)
+            elif kind == "cancel":
+                if await stop(sid):
+                    await send({"id": sid, "type": "error", "message": "cancelled by client"})
+            elif kind == "start":
+                if not sid or sid in streams:
+                    await send({"id": sid, "type": "error", "message": "missing or duplicate stream id"})
+                    continue
+                if len(streams) >= WS_MAX_STREAMS:
+                    await send({"id": sid, "type": "error", "message": f"at most {WS_MAX_STREAMS} concurrent streams"})
+                    continue
+                try:
+                    model, conversation_id, turn, history = await _parse_turn(frame)
+                    credit = _frame_int(frame, "window", WS_STREAM_WINDOW, 1, WS_MAX_STREAM_WINDOW)
+                except Exception as e:
+                    await send({"id": sid, "type": "error", "message": f"Invalid start frame: {e}"})
+                    continue
+                metrics.requests.inc(model, "ws_mux")
+                window = FlowWindow(credit)
+                windows[sid] = window
+                models[sid] = model
+                streams[sid] = asyncio.create_task(run_stream(sid, model, history, turn, conversation_id, window))
+    except WebSocketDisconnect:
+        pass
     finally:
-        cancel_event.set()
+        # Disconnected: every unfinished stream leaves its flight or the queue
+        for sid in list(streams):
+            await stop(sid)
         try:
             await ws.close()
         except Exception:
             pass
 
 
+# Built assets (/assets/index-<hash>.js, favicon, ...); registered last so API routes win
+@app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_asset(path: str, request: Request):
+    return static.serve(path, request)
+
+
 if __name__ == "__main__":
     import uvicorn
 
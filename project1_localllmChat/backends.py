@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+import httpx
+
+
+def _base_name(model: str) -> str:
+    """`llama3:latest` and `llama3` refer to the same model; used for every per-model lookup."""
+    return model[: -len(":latest")] if model.endswith(":latest") else model
+
+
+def is_host_failure(error: BaseException) -> bool:
+    """Whether `error` means the host is unwell (unreachable, or a 5xx) rather than the request being bad."""
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)  # ollama.ResponseError
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+    return isinstance(status, int) and status >= 500
+
+
+@dataclass
+class Backend:
+    url: str
+    healthy: bool = True
+    outstanding: int = 0
+    loaded: Set[str] = field(default_factory=set)  # models resident in memory (/api/ps)
+    available: Set[str] = field(default_factory=set)  # models pulled on the host (/api/tags)
+    resident_bytes: Dict[str, int] = field(default_factory=dict)  # memory used by loaded models (/api/ps)
+    model_bytes: Dict[str, int] = field(default_factory=dict)  # on-disk size of pulled models (/api/tags)
+    active: Dict[str, int] = field(default_factory=dict)  # outstanding requests per model
+    last_used: Dict[str, float] = field(default_factory=dict)
+    failures: int = 0
+    last_error: Optional[str] = None
+    last_probe: float = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "loaded": sorted(self.loaded),
+            "available": sorted(self.available),
+            "resident_bytes": sum(self.resident_bytes.values()),
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class BackendRegistry:
+    """The set of Ollama hosts, their health and their loaded models.
+
+    Each host is probed every `interval` seconds (/api/ps for loaded models,
+    /api/tags for pulled ones). `choose()` routes a request to the healthy host
+    with the fewest outstanding requests, counting `cold_penalty` extra for
+    hosts that would have to load the model first, so requests stick to warm
+    hosts until those are clearly busier.
+    """
+
+    def __init__(self, urls: Iterable[str], interval: float = 10.0, probe_timeout: float = 2.0, cold_penalty: int = 4):
+        self.backends: Dict[str, Backend] = {url.rstrip("/"): Backend(url=url.rstrip("/")) for url in urls}
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.cold_penalty = cold_penalty
+        self.failovers = 0
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self.backends)
+
+    async def _probe(self, backend: Backend):
+        try:
+            ps = await self._client.get(f"{backend.url}/api/ps")
+            tags = await self._client.get(f"{backend.url}/api/tags")
+            ps.raise_for_status()
+            tags.raise_for_status()
+            backend.resident_bytes = {
+                _base_name(m.get("model") or m.get("name", "")): int(m.get("size") or 0) for m in ps.json().get("models", [])
+            }
+            backend.model_bytes = {
+                _base_name(m.get("model") or m.get("name", "")): int(m.get("size") or 0) for m in tags.json().get("models", [])
+            }
+            backend.loaded = set(backend.resident_bytes)
+            backend.available = set(backend.model_bytes)
+            if not backend.healthy:
+                logging.info(f"Ollama backend {backend.url} is healthy again")
+            backend.healthy = True
+            backend.last_error = None
+        except Exception as e:
+            if backend.healthy:
+                logging.warning(f"Ollama backend {backend.url} failed health check: {e}")
+            backend.healthy = False
+            backend.last_error = str(e)
+        backend.last_probe = time.time()
+
+    async def probe_all(self):
+        await asyncio.gather(*(self._probe(b) for b in self.backends.values()))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.probe_all()
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=self.probe_timeout)
+        await self.probe_all()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._client is not None:
+            await self._client.aclose()
+
+    def choose(self, model: str, exclude: Iterable[str] = ()) -> Optional[Backend]:
+        """Pick a host for `model`, or None when every candidate is excluded."""
+        model = _base_name(model)
+        candidates = [b for b in self.backends.values() if b.url not in exclude]
+        healthy = [b for b in candidates if b.healthy]
+        # If every host looks down, still try them rather than fail outright
+        candidates = healthy or candidates
+        if not candidates:
+            return None
+
+        def score(b: Backend):
+            cold = 0 if model in b.loaded else self.cold_penalty
+            if b.available and model not in b.available:
+                cold += self.cold_penalty  # would need a pull, or the model is missing there
+            return (b.outstanding + cold, b.outstanding)
+
+        return min(candidates, key=score)
+
+    @staticmethod
+    def is_loaded(backend: Backend, model: str) -> bool:
+        return _base_name(model) in backend.loaded
+
+    @contextmanager
+    def lease(self, backend: Backend, model: str):
+        """Count an outstanding request on `backend` for the duration of the block."""
+        model = _base_name(model)
+        backend.outstanding += 1
+        backend.active[model] = backend.active.get(model, 0) + 1
+        try:
+            yield backend
+            backend.failures = 0
+            backend.loaded.add(model)
+        finally:
+            backend.outstanding -= 1
+            backend.active[model] -= 1
+            backend.last_used[model] = time.time()
+
+    def mark_failed(self, backend: Backend, error: Exception):
+        """Take a host out of rotation after a request failure; the next good probe restores it."""
+        backend.failures += 1
+        backend.healthy = False
+        backend.last_error = str(error)
+        self.failovers += 1
+
+    def stats(self) -> dict:
+        return {"failovers": self.failovers, "hosts": {url: b.stats() for url, b in self.backends.items()}}
@@ -0,0 +1,143 @@
+"""Stand-in Ollama HTTP server for benchmarking the chat backend without real models.
+
+Implements the parts of the Ollama API the backend uses (/api/chat, /api/generate,
+/api/embed, /api/tags, /api/ps). Tokens are streamed at a fixed rate after a
+configurable first-token latency, so throughput numbers measure the backend,
+not the model.
+
+    python bench/fake_ollama.py --port 11435 --tokens 64 --tokens-per-sec 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def create_app(
+    tokens: int = 64,
+    tokens_per_sec: float = 50.0,
+    latency: float = 0.2,
+    jitter: float = 0.0,
+    models=("llama3", "phi3", "mistral"),
+) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+    loaded = {}
+
+    def now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def chunk(model: str, key: str, text: str, done: bool, started: float) -> str:
+        """One NDJSON line; `key` is "message" for /api/chat and "response" for /api/generate."""
+        content = {"role": "assistant", "content": text} if key == "message" else text
+        body = {"model": model, "created_at": now(), key: content, "done": done}
+        if done:
+            elapsed = int((time.perf_counter() - started) * 1e9)
+            body.update(
+                done_reason="stop",
+                total_duration=elapsed,
+                load_duration=0,
+                prompt_eval_count=8,
+                prompt_eval_duration=int(latency * 1e9),
+                eval_count=tokens,
+                eval_duration=max(0, elapsed - int(latency * 1e9)),
+            )
+        return json.dumps(body) + "\n"
+
+    async def stream(model: str, key: str):
+        started = time.perf_counter()
+        loaded[model] = time.time()
+        await asyncio.sleep(latency + random.uniform(0, jitter))
+        interval = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        for i in range(tokens):
+            yield chunk(model, key, f"tok{i} ", False, started)
+            if interval:
+                await asyncio.sleep(interval)
+        yield chunk(model, key, "", True, started)
+
+    def full_text() -> str:
+        return "".join(f"tok{i} " for i in range(tokens))
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        if body.get("stream", True):
+            return StreamingResponse(stream(model, "message"), media_type="application/x-ndjson")
+        started = time.perf_counter()
+        await asyncio.sleep(latency + (tokens / tokens_per_sec if tokens_per_sec > 0 else 0.0))
+        return json.loads(chunk(model, "message", full_text(), True, started))
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        if body.get("keep_alive") in (0, "0", "0s"):
+            loaded.pop(model, None)
+            return {"model": model, "created_at": now(), "response": "", "done": True, "done_reason": "unload"}
+        if not body.get("prompt"):
+            # Empty prompt only loads the model, like real Ollama
+            loaded[model] = time.time()
+            return {"model": model, "created_at": now(), "response": "", "done": True, "done_reason": "load"}
+        if body.get("stream", True):
+            return StreamingResponse(stream(model, "response"), media_type="application/x-ndjson")
+        return json.loads(chunk(model, "response", full_text(), True, time.perf_counter()))
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        vectors = []
+        for text in inputs:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            vectors.append([b / 255.0 for b in digest])
+        return {"model": body.get("model", ""), "embeddings": vectors}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {
+            "models": [
+                {"name": f"{m}:latest", "model": f"{m}:latest", "size": 4_000_000_000, "digest": m, "details": {}}
+                for m in models
+            ]
+        }
+
+    @app.get("/api/ps")
+    async def ps():
+        return {
+            "models": [
+                {"name": f"{m}:latest", "model": f"{m}:latest", "size": 4_000_000_000, "size_vram": 0}
+                for m in loaded
+            ]
+        }
+
+    @app.get("/")
+    async def root():
+        return "Ollama is running"
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per response")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="streaming rate (0 = as fast as possible)")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra first-token latency, seconds")
+    args = parser.parse_args()
+
+    app = create_app(args.tokens, args.tokens_per_sec, args.latency, args.jitter)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
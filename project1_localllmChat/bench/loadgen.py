@@ -0,0 +1,225 @@
+"""Load generator for the chat backend.
+
+By default it starts `bench/fake_ollama.py` and `uvicorn app:app` (pointed at the
+fake server) as subprocesses, drives N concurrent clients against /chat,
+/chat/stream and /ws/chat, and prints a JSON report with p50/p95/p99 TTFT,
+total latency, throughput and error rate per mode. Use `--url` to benchmark a
+backend that is already running instead.
+
+    python bench/loadgen.py --concurrency 16 --requests 200 --out bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(HERE)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile of `values` (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(results: List[Dict], wall: float) -> Dict:
+    ok = [r for r in results if r["ok"]]
+    ttft = [r["ttft"] for r in ok if r["ttft"] is not None]
+    latency = [r["latency"] for r in ok]
+    tokens = sum(r["tokens"] for r in ok)
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "wall_seconds": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "throughput_tokens_per_sec": tokens / wall if wall else 0.0,
+        "ttft": {f"p{p}": percentile(ttft, p) for p in (50, 95, 99)},
+        "latency": {f"p{p}": percentile(latency, p) for p in (50, 95, 99)},
+    }
+
+
+def _prompt(unique: bool) -> List[Dict[str, str]]:
+    # Unique prompts keep the response cache out of the measurement
+    text = f"Benchmark prompt {uuid.uuid4().hex}" if unique else "Benchmark prompt"
+    return [{"role": "user", "content": text}]
+
+
+async def run_chat(client: httpx.AsyncClient, model: str, unique: bool) -> Dict:
+    start = time.perf_counter()
+    resp = await client.post("/chat", json={"model": model, "messages": _prompt(unique)})
+    latency = time.perf_counter() - start
+    if resp.status_code != 200:
+        return {"ok": False, "status": resp.status_code, "ttft": None, "latency": latency, "tokens": 0}
+    body = resp.json()
+    tokens = int(body.get("timings", {}).get("tokens", 0))
+    # /chat is not streamed, so the client only sees the first token with the last
+    return {"ok": True, "status": 200, "ttft": latency, "latency": latency, "tokens": tokens}
+
+
+async def run_sse(client: httpx.AsyncClient, model: str, unique: bool) -> Dict:
+    start = time.perf_counter()
+    ttft = None
+    event = None
+    ok = False
+    tokens = 0
+    async with client.stream("POST", "/chat/stream", json={"model": model, "messages": _prompt(unique)}) as resp:
+        if resp.status_code != 200:
+            return {"ok": False, "status": resp.status_code, "ttft": None, "latency": time.perf_counter() - start, "tokens": 0}
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                if event == "token" and ttft is None:
+                    ttft = time.perf_counter() - start
+                elif event == "done":
+                    ok = True
+                    tokens = int(json.loads(line[6:]).get("timings", {}).get("tokens", 0))
+    return {"ok": ok, "status": 200, "ttft": ttft, "latency": time.perf_counter() - start, "tokens": tokens}
+
+
+async def run_ws(ws_url: str, model: str, unique: bool) -> Dict:
+    start = time.perf_counter()
+    ttft = None
+    async with websockets.connect(ws_url + "/ws/chat") as ws:
+        await ws.send(json.dumps({"model": model, "messages": _prompt(unique)}))
+        async for raw in ws:
+            msg = json.loads(raw)
+            if msg["type"] == "token":
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+            elif msg["type"] == "done":
+                tokens = int(msg.get("timings", {}).get("tokens", 0))
+                return {"ok": True, "status": 200, "ttft": ttft, "latency": time.perf_counter() - start, "tokens": tokens}
+            else:
+                break
+    return {"ok": False, "status": 0, "ttft": ttft, "latency": time.perf_counter() - start, "tokens": 0}
+
+
+async def run_mode(mode: str, url: str, model: str, concurrency: int, requests: int, unique: bool) -> Dict:
+    ws_url = url.replace("http://", "ws://").replace("https://", "wss://")
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    remaining = iter(range(requests))
+    results: List[Dict] = []
+
+    async with httpx.AsyncClient(base_url=url, timeout=300.0, limits=limits) as client:
+
+        async def worker():
+            for _ in remaining:
+                try:
+                    if mode == "chat":
+                        results.append(await run_chat(client, model, unique))
+                    elif mode == "sse":
+                        results.append(await run_sse(client, model, unique))
+                    else:
+                        results.append(await run_ws(ws_url, model, unique))
+                except Exception as e:
+                    results.append({"ok": False, "status": 0, "error": str(e), "ttft": None, "latency": 0.0, "tokens": 0})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return summarize(results, wall)
+
+
+def _wait_for(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args) -> List[subprocess.Popen]:
+    fake = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(HERE, "fake_ollama.py"),
+            "--port", str(args.fake_port),
+            "--tokens", str(args.tokens),
+            "--tokens-per-sec", str(args.tokens_per_sec),
+            "--latency", str(args.latency),
+        ]
+    )
+    _wait_for(f"http://127.0.0.1:{args.fake_port}/")
+    env = dict(os.environ, OLLAMA_BASE_URL=f"http://127.0.0.1:{args.fake_port}")
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=PROJECT_DIR,
+        env=env,
+    )
+    _wait_for(f"http://127.0.0.1:{args.port}/health")
+    return [backend, fake]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the chat backend")
+    parser.add_argument("--url", help="benchmark an already running backend instead of starting one")
+    parser.add_argument("--modes", default="chat,sse,ws", help="comma-separated: chat, sse, ws")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64, help="requests per mode")
+    parser.add_argument("--repeat-prompt", action="store_true", help="send the same prompt every time (exercises caching)")
+    parser.add_argument("--port", type=int, default=8765, help="port for the spawned backend")
+    parser.add_argument("--fake-port", type=int, default=11435, help="port for the spawned fake Ollama")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    procs = [] if args.url else start_servers(args)
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    try:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "config": {
+                "url": url,
+                "model": args.model,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "unique_prompts": not args.repeat_prompt,
+                "fake_ollama": None if args.url else {
+                    "tokens": args.tokens, "tokens_per_sec": args.tokens_per_sec, "latency": args.latency,
+                },
+            },
+            "modes": {},
+        }
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            report["modes"][mode] = asyncio.run(
+                run_mode(mode, url, args.model, args.concurrency, args.requests, not args.repeat_prompt)
+            )
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
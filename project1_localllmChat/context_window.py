@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backends import _base_name
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def _cl100k():
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenCounter:
+    """Approximate prompt token counts per model.
+
+    Ollama does not expose its tokenizers, so counts come from tiktoken's
+    `cl100k_base` scaled by a per-model factor (SentencePiece vocabularies such
+    as Mistral's produce more tokens than llama3's tiktoken-style one). The
+    encoding is loaded once, in a worker thread by `start()`, since a cold
+    tiktoken cache downloads it; until then, or if it cannot be loaded (e.g.
+    offline), ~4 characters per token is used. Counts are memoized per message
+    text, since every turn resends the history.
+    """
+
+    def __init__(self, factors: Optional[Dict[str, float]] = None, default_factor: float = 1.1, max_cached: int = 8192):
+        self.factors = {_base_name(k): v for k, v in (factors or {}).items()}
+        self.default_factor = default_factor
+        self.max_cached = max_cached
+        self._encoding = None
+        self._task: Optional[asyncio.Task] = None
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+    async def start(self):
+        """Load the encoding in the background so startup is not blocked on a download."""
+        self._task = asyncio.create_task(self._load())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _load(self):
+        try:
+            self._encoding = await asyncio.to_thread(_cl100k)
+        except Exception as e:
+            logging.warning(f"tiktoken encoding unavailable, estimating tokens from characters: {e}")
+            return
+        # Counts so far were character estimates
+        self._counts.clear()
+
+    def _encode_len(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def count_text(self, text: str) -> int:
+        n = self._counts.get(text)
+        if n is None:
+            n = self._encode_len(text)
+            self._counts[text] = n
+            if len(self._counts) > self.max_cached:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(text)
+        return n
+
+    def count(self, model: str, messages: List[Dict[str, str]]) -> int:
+        factor = self.factors.get(_base_name(model), self.default_factor)
+        # ~4 tokens of chat-template overhead per message
+        raw = sum(self.count_text(m.get("content") or "") + 4 for m in messages)
+        return int(raw * factor + 0.5)
+
+
+@dataclass
+class ContextReport:
+    original_tokens: int = 0
+    prompt_tokens: int = 0
+    summarized_messages: int = 0
+    dropped_messages: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.prompt_tokens)
+
+
+class ContextWindow:
+    """Fit chat histories into a per-model token budget.
+
+    Leading system messages and the most recent turns are kept verbatim. Older
+    turns that no longer fit are replaced by one rolling summary, produced by
+    `summarize(model, text)` and cached by a chained hash of the summarized
+    prefix: the next turn extends the cached summary with just the newly
+    evicted messages instead of re-reading the whole conversation. Without a
+    summarizer (or if it fails) old turns are dropped.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        windows: Dict[str, int],
+        default_window: int = 4096,
+        reserve: int = 1024,
+        summary_tokens: int = 256,
+        summarize: Optional[Callable[[str, str], Awaitable[str]]] = None,
+        max_summaries: int = 512,
+    ):
+        self.counter = counter
+        self.windows = {_base_name(k): v for k, v in windows.items()}
+        self.default_window = default_window
+        self.reserve = reserve
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.max_summaries = max_summaries
+        self.tokens_saved = 0
+        self.summaries_built = 0
+        self.summary_hits = 0
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+
+    def window(self, model: str) -> int:
+        """Context window of `model`; clients must send it as `num_ctx` so Ollama does not truncate."""
+        return self.windows.get(_base_name(model), self.default_window)
+
+    def budget(self, model: str) -> int:
+        """Prompt tokens allowed for `model`, leaving `reserve` for the reply."""
+        return max(256, self.window(model) - self.reserve)
+
+    @staticmethod
+    def _chain(messages: List[Dict[str, str]]) -> List[str]:
+        """Hash of every prefix: hashes[i] covers messages[:i + 1]."""
+        hashes, h = [], b""
+        for m in messages:
+            h = hashlib.sha256(h + f"{m.get('role')}\0{m.get('content')}\0".encode("utf-8")).digest()
+            hashes.append(h.hex())
+        return hashes
+
+    def _remember(self, model: str, prefix_hash: str, summary: str):
+        key = f"{model}:{prefix_hash}"
+        self._summaries[key] = summary
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+
+    async def _summary_for(self, model: str, old: List[Dict[str, str]]) -> Optional[str]:
+        hashes = self._chain(old)
+        # Longest prefix of `old` that already has a summary
+        start, previous = 0, None
+        for i in range(len(old) - 1, -1, -1):
+            cached = self._summaries.get(f"{model}:{hashes[i]}")
+            if cached is not None:
+                start, previous = i + 1, cached
+                self._summaries.move_to_end(f"{model}:{hashes[i]}")
+                break
+        if start == len(old):
+            self.summary_hits += 1
+            return previous
+        if self.summarize is None:
+            return None
+
+        lines = [f"{m.get('role')}: {m.get('content')}" for m in old[start:]]
+        text = "\n".join(([f"Earlier summary: {previous}"] if previous else []) + lines)
+        try:
+            summary = (await self.summarize(model, text)).strip()
+        except Exception as e:
+            logging.warning(f"Context summary for '{model}' failed, dropping old turns instead: {e}")
+            return previous
+        self.summaries_built += 1
+        self._remember(model, hashes[-1], summary)
+        return summary
+
+    async def fit(self, model: str, messages: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], ContextReport]:
+        """Return the messages to send for `model` and what fitting them saved."""
+        count = self.counter.count
+        report = ContextReport(original_tokens=count(model, messages))
+        budget = self.budget(model)
+        if report.original_tokens <= budget:
+            report.prompt_tokens = report.original_tokens
+            return messages, report
+
+        n_system = 0
+        while n_system < len(messages) and messages[n_system].get("role") == "system":
+            n_system += 1
+        system, rest = messages[:n_system], messages[n_system:]
+
+        # Newest turns first, leaving room for the summary; the last message always goes
+        available = budget - count(model, system) - self.summary_tokens
+        keep = len(rest)
+        used = 0
+        while keep > 0:
+            cost = count(model, rest[keep - 1 : keep])
+            if used + cost > available and keep < len(rest):
+                break
+            used += cost
+            keep -= 1
+        old, recent = rest[:keep], rest[keep:]
+
+        summary = await self._summary_for(model, old) if old else None
+        fitted = list(system)
+        if summary:
+            fitted.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+            report.summarized_messages = len(old)
+        else:
+            report.dropped_messages = len(old)
+        fitted += recent
+
+        report.prompt_tokens = count(model, fitted)
+        self.tokens_saved += report.tokens_saved
+        return fitted, report
+
+    def stats(self) -> dict:
+        return {
+            "tokens_saved": self.tokens_saved,
+            "summaries_built": self.summaries_built,
+            "summary_hits": self.summary_hits,
+            "summaries_cached": len(self._summaries),
+        }
@@ -1,4 +1,4 @@
-import { useState, useRef } from 'react'
+import { useState, useRef, useEffect, useMemo } from 'react'
 import {
   Box,
   Button,
@@ -19,13 +19,61 @@ type Message = {
   content: string
 };
 
+type ModelInfo = {
+  name: string
+  loaded: boolean
+};
+
 export default function App() {
   const [model, setModel] = useState<string[]>(['llama3'])
   const [chat, setChat] = useState<Message[]>([])
   const [prompt, setPrompt] = useState('')
   const wsRef = useRef<WebSocket | null>(null)
-  
-  async function startWebsocket(messages: Message[]) {
+  const conversationRef = useRef<string | null>(null)
+  const backend = `${location.protocol === 'https:' ? 'https' : 'http'}://${location.hostname}:8000`
+  const [available, setAvailable] = useState<ModelInfo[]>([
+    { name: 'llama3', loaded: false },
+    { name: 'phi3', loaded: false },
+    { name: 'mistral', loaded: false },
+  ])
+
+  // Models actually pulled on the Ollama hosts; loaded ones answer without a cold start
+  useEffect(() => {
+    fetch(backend + '/models')
+      .then((res) => res.json())
+      .then((data) => {
+        const list: ModelInfo[] = data.models ?? []
+        if (!list.length) return
+        setAvailable(list)
+        setModel((current) =>
+          list.some((m) => m.name === current[0])
+            ? current
+            : [(list.find((m) => m.loaded) ?? list[0]).name]
+        )
+      })
+      .catch((e) => console.error('list models', e))
+  }, [backend])
+
+  async function ensureConversation(): Promise<string | null> {
+    if (conversationRef.current) return conversationRef.current
+    try {
+      const res = await fetch(backend + '/conversations', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ model: model[0] }),
+      })
+      if (!res.ok) throw new Error(`HTTP ${res.status}`)
+      conversationRef.current = (await res.json()).conversation_id
+    } catch (e) {
+      console.error('create conversation', e)
+    }
+    return conversationRef.current
+  }
+
+  // With a conversation id only the new turn is sent; the server keeps the history
+  async function startWebsocket(messages: Message[], turn: Message[], retry = true) {
+    const conversationId = await ensureConversation()
+
     if (wsRef.current) {
       wsRef.current.close()
       wsRef.current = null
@@ -36,8 +84,11 @@ export default function App() {
 
     ws.onopen = () => {
       console.log('ws open')
-      console.log('ws send', { model, messages })
-      ws.send(JSON.stringify({ model, messages }))
+      const payload = conversationId
+        ? { model: model[0], conversation_id: conversationId, messages: turn }
+        : { model: model[0], messages }
+      console.log('ws send', payload)
+      ws.send(JSON.stringify(payload))
     }
 
     ws.onmessage = (ev) => {
@@ -55,6 +106,12 @@ export default function App() {
         } else if (msg.type === 'done') {
           // append done info
         } else if (msg.type === 'error') {
+          if (retry && conversationId && String(msg.message).includes('unknown conversation')) {
+            // The server restarted or evicted it: start a new one, seeded with the whole history
+            conversationRef.current = null
+            startWebsocket(messages, messages, false)
+            return
+          }
           setChat((c) => [...c, { role: 'assistant', content: 'Error: ' + msg.message }])
         }
       } catch (e) {
@@ -63,7 +120,8 @@ export default function App() {
     }
 
     ws.onclose = () => {
-      wsRef.current = null
+      // A retry may already have replaced this socket
+      if (wsRef.current === ws) wsRef.current = null
     }
   }
 
@@ -72,7 +130,7 @@ export default function App() {
     const messages: Message[] = [...chat, userMsg]
     setChat(messages)
     setPrompt('')
-    startWebsocket(messages)
+    startWebsocket(messages, [userMsg])
   }
 
   function cancel() {
@@ -80,13 +138,13 @@ export default function App() {
       wsRef.current.send(JSON.stringify({ action: 'cancel' }))
     }
   }
-  const models = createListCollection({
-    items: [
-      { value: 'llama3', label: 'llama3' },
-      { value: 'phi3', label: 'phi3' },
-      { value: 'mistral', label: 'mistral' },
-    ]
-  });
+  const models = useMemo(
+    () =>
+      createListCollection({
+        items: available.map((m) => ({ value: m.name, label: m.loaded ? `${m.name} (loaded)` : m.name })),
+      }),
+    [available]
+  )
 
   return (
     <Container fluid px={4} py={6}>
@@ -117,7 +175,7 @@ export default function App() {
               <Select.Positioner>
                 <Select.Content>
                   {models.items.map((item) => (
-                    <Select.Item key={item.label} item={item}>
+                    <Select.Item key={item.value} item={item}>
                       <Select.ItemText>{item.label}</Select.ItemText>
                       <Select.ItemIndicator>
                         <Select.Indicator />
@@ -0,0 +1,193 @@
+import bisect
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[str]:
+        return []
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] += amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or read from `collect()` at scrape time (free on the hot path)."""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = defaultdict(float)
+        self._collect = collect
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] += amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self._values[labels] -= amount
+
+    def samples(self):
+        values = self._collect() if self._collect is not None else self._values
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; `observe` is one bisect plus three additions."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                le_label = f'le="{le}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le_label)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+class ChatMetrics:
+    """The chat backend's metrics.
+
+    Latency figures are recorded once per request from its GenerationStats,
+    never per token. In-flight and queued counts are read from the scheduler at
+    scrape time.
+    """
+
+    def __init__(self, scheduler_stats: Callable[[], dict]):
+        self.registry = Registry()
+        r = self.registry.register
+        self.requests = r(Counter("chat_requests_total", "Chat requests received", ("model", "endpoint")))
+        self.ttft = r(Histogram("chat_ttft_seconds", "Time to first token, including queue wait", ("model",)))
+        self.latency = r(Histogram("chat_request_duration_seconds", "Total request latency", ("model",)))
+        self.tokens_per_sec = r(
+            Histogram("chat_tokens_per_second", "Generation throughput per request", ("model",), buckets=RATE_BUCKETS)
+        )
+        self.in_flight = r(
+            Gauge(
+                "chat_requests_in_flight",
+                "Generations currently running",
+                ("model",),
+                collect=lambda: {(m,): s["in_flight"] for m, s in scheduler_stats()["models"].items()},
+            )
+        )
+        self.queued = r(
+            Gauge(
+                "chat_requests_queued",
+                "Requests waiting for a scheduler slot",
+                ("model",),
+                collect=lambda: {(m,): s["queued"] for m, s in scheduler_stats()["models"].items()},
+            )
+        )
+        self.websockets = r(Gauge("chat_websocket_connections", "Open WebSocket connections", ("path",)))
+        for path in ("/ws/chat", "/ws/mux"):
+            self.websockets.inc(path, amount=0)
+        self.cancellations = r(
+            Counter("chat_cancellations_total", "Requests cancelled or abandoned by the client", ("model", "endpoint"))
+        )
+        self.errors = r(Counter("chat_errors_total", "Failed requests", ("model", "endpoint", "reason")))
+        self.coalesced = r(
+            Counter("chat_coalesced_total", "Requests served by joining an identical in-flight generation", ("model",))
+        )
+        self.context_tokens_saved = r(
+            Counter("chat_context_tokens_saved_total", "Prompt tokens removed by fitting the context window", ("model",))
+        )
+        self.cold_starts = r(Counter("chat_cold_starts_total", "Requests that had to load their model", ("model",)))
+        self.model_load = r(Histogram("chat_model_load_seconds", "Model load time reported by Ollama", ("model",)))
+
+    def observe(self, model: str, stats):
+        """Record a completed request from its GenerationStats."""
+        timings = stats.timings()
+        self.ttft.observe(timings["ttft"], model)
+        self.latency.observe(time.perf_counter() - stats.start, model)
+        if timings["tokens_per_sec"] and not stats.cached:
+            # Cache replays would swamp the throughput distribution
+            self.tokens_per_sec.observe(timings["tokens_per_sec"], model)
+        if stats.cold:
+            self.cold_starts.inc(model)
+            self.model_load.observe(stats.load_duration, model)
+
+    def render(self) -> str:
+        return self.registry.render()
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ollama import AsyncClient
+
+from backends import Backend, BackendRegistry, _base_name
+
+
+class ModelManager:
+    """Which models are loaded where: warm-up, listing and eviction under memory pressure.
+
+    `warm_models` are loaded at startup (and pinned by the pool's keep-alive
+    override). Every other model stays resident while it is used, through the
+    regular per-request keep-alive. A host is under pressure when it holds more
+    than `max_loaded` models or more than `memory_budget` bytes; then its idle
+    models are unloaded, least recently used first and warm models last.
+    Models with requests in flight, or used within `idle_grace` seconds, are
+    never unloaded.
+    """
+
+    def __init__(
+        self,
+        backends: BackendRegistry,
+        client_for: Callable[[str, str], AsyncClient],
+        keep_alive_for: Callable[[str], object],
+        context_window_for: Optional[Callable[[str], int]] = None,
+        warm_models: Iterable[str] = (),
+        max_loaded: int = 0,
+        memory_budget: int = 0,
+        idle_grace: float = 60.0,
+        interval: float = 30.0,
+    ):
+        self.backends = backends
+        self.client_for = client_for
+        self.keep_alive_for = keep_alive_for
+        self.context_window_for = context_window_for
+        self.warm_models = [_base_name(m) for m in warm_models if m]
+        self.max_loaded = max_loaded
+        self.memory_budget = memory_budget
+        self.idle_grace = idle_grace
+        self.interval = interval
+        self.loads = 0
+        self.evictions = 0
+        self.warmup_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def models(self) -> List[dict]:
+        """Models pulled on any healthy host, with where they are loaded."""
+        found: Dict[str, dict] = {}
+        for backend in self.backends.backends.values():
+            if not backend.healthy:
+                continue
+            for name in backend.available | backend.loaded:
+                entry = found.setdefault(name, {"name": name, "size": 0, "hosts": [], "loaded_on": []})
+                entry["size"] = max(entry["size"], backend.model_bytes.get(name, 0))
+                entry["hosts"].append(backend.url)
+                if name in backend.loaded:
+                    entry["loaded_on"].append(backend.url)
+        for entry in found.values():
+            entry["loaded"] = bool(entry["loaded_on"])
+            entry["warm"] = entry["name"] in self.warm_models
+        return sorted(found.values(), key=lambda e: e["name"])
+
+    async def load(self, backend: Backend, model: str) -> float:
+        """Load `model` on `backend` without generating anything; returns the seconds it took."""
+        started = time.perf_counter()
+        # Load with the num_ctx chats will send, or the first chat reloads the model
+        options = {"num_ctx": self.context_window_for(model)} if self.context_window_for else None
+        await self.client_for(model, backend.url).generate(
+            model=model, keep_alive=self.keep_alive_for(model), options=options
+        )
+        backend.loaded.add(model)
+        self.loads += 1
+        return time.perf_counter() - started
+
+    async def unload(self, backend: Backend, model: str):
+        await self.client_for(model, backend.url).generate(model=model, keep_alive=0)
+        backend.loaded.discard(model)
+        backend.resident_bytes.pop(model, None)
+        self.evictions += 1
+
+    def _over_limit(self, backend: Backend, incoming: Optional[str]) -> bool:
+        names = set(backend.loaded)
+        used = sum(backend.resident_bytes.get(m, 0) for m in names)
+        if incoming and incoming not in names:
+            names.add(incoming)
+            used += backend.model_bytes.get(incoming, 0)
+        if self.max_loaded and len(names) > self.max_loaded:
+            return True
+        return bool(self.memory_budget) and used > self.memory_budget
+
+    def _victims(self, backend: Backend, keep: Optional[str]) -> List[str]:
+        now = time.time()
+        idle = [
+            m
+            for m in backend.loaded
+            if m != keep and not backend.active.get(m) and now - backend.last_used.get(m, 0.0) >= self.idle_grace
+        ]
+        return sorted(idle, key=lambda m: (m in self.warm_models, backend.last_used.get(m, 0.0)))
+
+    async def make_room(self, backend: Backend, model: Optional[str] = None):
+        """Unload idle models from `backend` until `model` (if given) fits within the limits."""
+        if not (self.max_loaded or self.memory_budget):
+            return
+        model = _base_name(model) if model else None
+        lock = self._locks.setdefault(backend.url, asyncio.Lock())
+        async with lock:
+            if model and model in backend.loaded:
+                return
+            for victim in self._victims(backend, keep=model):
+                if not self._over_limit(backend, model):
+                    break
+                try:
+                    await self.unload(backend, victim)
+                    logging.info(f"Unloaded idle model '{victim}' from {backend.url} to free memory")
+                except Exception as e:
+                    logging.warning(f"Could not unload '{victim}' from {backend.url}: {e}")
+                    break
+            if model:
+                # Count it as loaded right away, so concurrent cold requests do not evict twice
+                backend.loaded.add(model)
+                if model in backend.model_bytes:
+                    backend.resident_bytes[model] = backend.model_bytes[model]
+
+    async def warm_up(self):
+        for model in self.warm_models:
+            backend = self.backends.choose(model)
+            if backend is None or not backend.healthy or self.backends.is_loaded(backend, model):
+                continue
+            try:
+                await self.make_room(backend, model)
+                self.warmup_seconds[model] = await self.load(backend, model)
+                logging.info(f"Warmed up '{model}' on {backend.url} in {self.warmup_seconds[model]:.1f}s")
+            except Exception as e:
+                logging.warning(f"Warm-up of '{model}' on {backend.url} failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for backend in list(self.backends.backends.values()):
+                if backend.healthy:
+                    await self.make_room(backend)
+
+    async def start(self):
+        """Warm up in the background so startup is not blocked on model loads."""
+        self._tasks = [asyncio.create_task(self.warm_up())]
+        if self.max_loaded or self.memory_budget:
+            self._tasks.append(asyncio.create_task(self._run()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "warm_models": self.warm_models,
+            "warmup_seconds": self.warmup_seconds,
+            "max_loaded": self.max_loaded,
+            "memory_budget": self.memory_budget,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,116 @@
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+import httpx
+from ollama import AsyncClient, Client
+from llama_index.llms.ollama import Ollama
+
+from backends import _base_name
+
+
+class OllamaClientPool:
+    """Pool of long-lived Ollama clients keyed by (host, model).
+
+    Each model on each host gets one `Ollama` instance whose sync and async HTTP clients are
+    shared by every request, so keep-alive connections are reused instead of
+    opening a new connection (and handshake) per message. The number of
+    connections per model is capped by the httpx connection limits.
+
+    `keep_alive` is sent with every request so the model, and the prompt prefix
+    Ollama has already evaluated for a conversation, stays resident between turns.
+    `keep_alive_overrides` sets a different value for particular models (e.g. -1
+    to pin warmed-up models in memory).
+    `context_window_for(model)` sets each client's context window (`num_ctx`);
+    without it llama-index's default of 3900 tokens is sent.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        request_timeout: float = 120.0,
+        max_connections: int = 8,
+        keepalive_expiry: float = 60.0,
+        keep_alive: Optional[Union[float, str]] = None,
+        keep_alive_overrides: Optional[Dict[str, Union[float, str]]] = None,
+        context_window_for: Optional[Callable[[str], int]] = None,
+    ):
+        self.base_url = base_url
+        self.request_timeout = request_timeout
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.keep_alive = keep_alive
+        self.keep_alive_overrides = {_base_name(k): v for k, v in (keep_alive_overrides or {}).items()}
+        self.context_window_for = context_window_for
+        self.hits = 0
+        self.misses = 0
+        self._llms: Dict[Tuple[str, str], Ollama] = {}
+        self._lock = threading.Lock()
+
+    def keep_alive_for(self, model: str) -> Optional[Union[float, str]]:
+        return self.keep_alive_overrides.get(_base_name(model), self.keep_alive)
+
+    def _create(self, base_url: str, model: str) -> Ollama:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        extra = {"context_window": self.context_window_for(model)} if self.context_window_for else {}
+        return Ollama(
+            model=model,
+            base_url=base_url,
+            request_timeout=self.request_timeout,
+            keep_alive=self.keep_alive_for(model),
+            client=Client(host=base_url, timeout=self.request_timeout, limits=limits),
+            async_client=AsyncClient(host=base_url, timeout=self.request_timeout, limits=limits),
+            **extra,
+        )
+
+    def get(self, model: str, base_url: Optional[str] = None) -> Ollama:
+        """Return the pooled client for `model` on `base_url` (default host), creating it on first use."""
+        key = (base_url or self.base_url, model)
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is not None:
+                self.hits += 1
+                return llm
+            self.misses += 1
+            llm = self._create(*key)
+            self._llms[key] = llm
+            return llm
+
+    def preload(self, models: Iterable[str], base_urls: Optional[Iterable[str]] = None) -> None:
+        """Create clients for `models` on every host up front (does not count as hits/misses)."""
+        with self._lock:
+            for base_url in base_urls or [self.base_url]:
+                for model in models:
+                    if model and (base_url, model) not in self._llms:
+                        self._llms[(base_url, model)] = self._create(base_url, model)
+        logging.info(f"Ollama pool ready for: {self._names()}")
+
+    def _names(self):
+        return sorted(f"{model}@{base_url}" for base_url, model in self._llms)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "clients": self._names(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "max_connections_per_model": self.max_connections,
+        }
+
+    async def aclose(self) -> None:
+        """Close every pooled HTTP client; called on app shutdown."""
+        with self._lock:
+            llms = list(self._llms.values())
+            self._llms.clear()
+        for llm in llms:
+            try:
+                llm.client._client.close()
+                await llm.async_client._client.aclose()
+            except Exception:
+                logging.exception(f"Error closing Ollama client for {llm.model}")
+        logging.info(f"Ollama pool closed ({len(llms)} clients)")
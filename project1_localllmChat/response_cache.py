@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalize_content(content: Optional[str]) -> str:
+    return _WS_RE.sub(" ", content or "").strip()
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> str:
+    """Canonical text for a conversation: roles lower-cased, whitespace collapsed."""
+    return json.dumps(
+        [[(m.get("role") or "").lower(), _normalize_content(m.get("content"))] for m in messages],
+        ensure_ascii=False,
+    )
+
+
+def split_question(messages: List[Dict[str, str]]):
+    """(everything but the last user turn, the last user turn's normalized text)."""
+    for i in range(len(messages) - 1, -1, -1):
+        if (messages[i].get("role") or "").lower() == "user":
+            return messages[:i] + messages[i + 1 :], _normalize_content(messages[i].get("content"))
+    return messages, ""
+
+
+@dataclass
+class _Entry:
+    model: str
+    scope: Optional[str]  # semantic index the entry's vector is in
+    response: str
+    size: int
+    expires_at: float
+
+
+@dataclass
+class CacheLookup:
+    """Result of `ResponseCache.lookup`; pass it back to `store` after a miss."""
+
+    model: str
+    key: str
+    text: str
+    response: Optional[str] = None
+    tier: Optional[str] = None  # "exact" or "semantic" on a hit
+    scope: Optional[str] = None  # model + hash of the history before the last user turn
+    vector: Optional[np.ndarray] = None  # embedding of the last user turn
+
+
+class ResponseCache:
+    """Two-tier cache of complete chat responses.
+
+    The exact tier is keyed by model plus a hash of the normalized messages.
+    When an `embed` coroutine is given, a semantic tier also matches a
+    conversation whose last user turn has a normalized-embedding cosine
+    similarity of at least `threshold` to a cached one, provided the model and
+    every other message are exactly the same: only the final question is
+    embedded, and the rest of the history is hashed into the index it is
+    looked up in, so a long shared history cannot make different questions
+    look alike. Entries expire after `ttl` seconds and the
+    least recently used ones are evicted to stay within `max_entries` and
+    `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600.0,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        embed: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+        threshold: float = 0.95,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.embed = embed
+        self.threshold = threshold
+        self.bytes = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Semantic index per scope (model + history): keys plus a stacked matrix, rebuilt lazily
+        self._vectors: Dict[str, Dict[str, np.ndarray]] = defaultdict(dict)
+        self._matrix: Dict[str, tuple] = {}
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(lambda: {"exact": 0, "semantic": 0, "miss": 0})
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry.size
+        vectors = self._vectors.get(entry.scope)
+        if vectors is not None and vectors.pop(key, None) is not None:
+            self._matrix.pop(entry.scope, None)
+            if not vectors:
+                del self._vectors[entry.scope]
+
+    def _get_exact(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, scope: str, vector: np.ndarray) -> Optional[str]:
+        vectors = self._vectors.get(scope)
+        if not vectors:
+            return None
+        cached = self._matrix.get(scope)
+        if cached is None:
+            cached = (list(vectors), np.stack(list(vectors.values())))
+            self._matrix[scope] = cached
+        keys, matrix = cached
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.threshold else None
+
+    async def _vector(self, text: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(await self.embed(text), dtype=np.float32)
+        except Exception as e:
+            logging.warning(f"Cache embedding failed, semantic tier skipped: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def lookup(self, model: str, messages: List[Dict[str, str]]) -> CacheLookup:
+        text = normalize_messages(messages)
+        result = CacheLookup(model=model, key=self.key(model, text), text=text)
+        entry = self._get_exact(result.key)
+        if entry is not None:
+            result.response, result.tier = entry.response, "exact"
+        elif self.embed is not None:
+            history, question = split_question(messages)
+            result.scope = self.key(model, normalize_messages(history))
+            result.vector = await self._vector(question) if question else None
+            if result.vector is not None:
+                key = self._nearest(result.scope, result.vector)
+                entry = self._get_exact(key) if key else None
+                if entry is not None:
+                    result.response, result.tier = entry.response, "semantic"
+        self._counters[model][result.tier or "miss"] += 1
+        return result
+
+    def store(self, lookup: CacheLookup, response: str):
+        """Cache a completed response for the prompt described by `lookup`."""
+        size = len(response.encode("utf-8")) + len(lookup.text)
+        if size > self.max_bytes:
+            return
+        self._remove(lookup.key)
+        self._entries[lookup.key] = _Entry(
+            model=lookup.model,
+            scope=lookup.scope if lookup.vector is not None else None,
+            response=response,
+            size=size,
+            expires_at=time.time() + self.ttl,
+        )
+        self.bytes += size
+        if lookup.vector is not None:
+            self._vectors[lookup.scope][lookup.key] = lookup.vector
+            self._matrix.pop(lookup.scope, None)
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        models = {}
+        for model, c in self._counters.items():
+            total = c["exact"] + c["semantic"] + c["miss"]
+            models[model] = {**c, "hit_rate": (c["exact"] + c["semantic"]) / total if total else 0.0}
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "semantic": self.embed is not None,
+            "models": models,
+        }
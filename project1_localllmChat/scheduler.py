@@ -0,0 +1,130 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+
+class QueueFullError(Exception):
+    """Raised when a model's wait queue is full; callers should reply 429."""
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"Model '{model}' is busy, retry in {retry_after}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    model: str
+    priority: int
+    queue_wait: float = 0.0
+
+
+@dataclass
+class _ModelState:
+    in_flight: int = 0
+    waiters: List = field(default_factory=list)  # heap of (priority, seq, future)
+    avg_service: float = 5.0  # EWMA of slot hold time, seconds
+
+
+class ModelScheduler:
+    """Per-model admission control in front of Ollama.
+
+    At most `max_in_flight` generations run per model. Further requests wait in
+    a bounded priority queue (interactive before batch, FIFO within a priority);
+    once `max_queue` requests are waiting, new ones are rejected immediately
+    with a Retry-After estimate instead of piling onto the model.
+    """
+
+    def __init__(self, max_in_flight: int = 2, max_queue: int = 32):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.rejected = 0
+        self._models: Dict[str, _ModelState] = {}
+        self._seq = itertools.count()
+
+    def _state(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = _ModelState()
+        return state
+
+    def _queued(self, state: _ModelState) -> int:
+        return sum(1 for _, _, fut in state.waiters if not fut.done())
+
+    def retry_after(self, model: str) -> int:
+        state = self._state(model)
+        backlog = self._queued(state) + 1
+        return max(1, math.ceil(state.avg_service * backlog / self.max_in_flight))
+
+    def check(self, model: str):
+        """Raise QueueFullError now if a new request for `model` would be rejected."""
+        if self._queued(self._state(model)) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(model, self.retry_after(model))
+
+    async def acquire(self, model: str, priority: int = PRIORITY_BATCH) -> Ticket:
+        state = self._state(model)
+        ticket = Ticket(model=model, priority=priority)
+        if state.in_flight < self.max_in_flight and not self._queued(state):
+            state.in_flight += 1
+            return ticket
+
+        self.check(model)
+
+        start = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self._release(model)
+            raise
+        ticket.queue_wait = time.perf_counter() - start
+        return ticket
+
+    def _release(self, model: str):
+        state = self._state(model)
+        while state.waiters:
+            _, _, fut = heapq.heappop(state.waiters)
+            if not fut.done():
+                # Hand the slot straight to the next waiter; in_flight is unchanged
+                fut.set_result(None)
+                return
+        state.in_flight -= 1
+
+    def release(self, model: str, service_time: float):
+        state = self._state(model)
+        state.avg_service = 0.8 * state.avg_service + 0.2 * service_time
+        self._release(model)
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = PRIORITY_BATCH) -> AsyncIterator[Ticket]:
+        """Hold one of the model's in-flight slots for the duration of the block."""
+        ticket = await self.acquire(model, priority)
+        start = time.perf_counter()
+        try:
+            yield ticket
+        finally:
+            self.release(model, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "models": {
+                model: {"in_flight": state.in_flight, "queued": self._queued(state)}
+                for model, state in self._models.items()
+            },
+        }
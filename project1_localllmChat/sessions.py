@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class Session:
+    id: str
+    model: Optional[str] = None
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+
+
+class SessionStore:
+    """Server-side conversation history, so clients only send the new turn.
+
+    Sessions live in an in-memory LRU of `max_sessions` entries. When `db_path`
+    is set, every write also goes to SQLite and LRU misses are read back from
+    it, so conversations survive eviction and restarts. The in-memory copy is
+    updated first, and SQLite reads (`aget`) and writes run in a worker thread,
+    so the event loop never waits on the disk; each row only replaces an older
+    version. Deleted ids are remembered (the last `max_sessions` of them) so a
+    write or read still in flight cannot bring the conversation back.
+    """
+
+    def __init__(self, max_sessions: int = 1000, db_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._deleted: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()  # one connection, shared by the worker threads
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, model TEXT, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _remember(self, session: Session):
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _write(self, session_id: str, model: Optional[str], messages: List[Dict[str, str]], updated_at: float):
+        # Writes can finish out of order; a row never overwrites a newer one or a deletion
+        with self._db_lock:
+            with self._lock:
+                deleted = session_id in self._deleted
+            if self._db is None or deleted:
+                return
+            self._db.execute(
+                "INSERT INTO sessions (id, model, messages, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET model = excluded.model, messages = excluded.messages, "
+                "updated_at = excluded.updated_at WHERE excluded.updated_at >= sessions.updated_at",
+                (session_id, model, json.dumps(messages), updated_at),
+            )
+            self._db.commit()
+
+    async def _persist(self, session: Session):
+        """Write a snapshot of `session` to SQLite off the event loop."""
+        if self._db is None:
+            return
+        with self._lock:
+            snapshot = (session.id, session.model, list(session.messages), session.updated_at)
+        await asyncio.to_thread(self._write, *snapshot)
+
+    async def create(self, model: Optional[str] = None) -> Session:
+        session = Session(id=uuid.uuid4().hex, model=model)
+        with self._lock:
+            self._remember(session)
+        await self._persist(session)
+        return session
+
+    def _cached(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def _read_row(self, session_id: str) -> Optional[Session]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT model, messages, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return Session(id=session_id, model=row[0], messages=json.loads(row[1]), updated_at=row[2])
+
+    def _loaded(self, session: Optional[Session]) -> Optional[Session]:
+        """Cache a session read from SQLite, unless it was deleted or loaded meanwhile."""
+        if session is None:
+            return None
+        with self._lock:
+            if session.id in self._deleted:
+                return None
+            current = self._sessions.get(session.id)
+            if current is not None:
+                return current
+            self._remember(session)
+            return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Blocking lookup, for callers outside the event loop; handlers use `aget`."""
+        session = self._cached(session_id)
+        if session is None and self._db is not None:
+            session = self._loaded(self._read_row(session_id))
+        return session
+
+    async def aget(self, session_id: str) -> Optional[Session]:
+        """Like `get`, but an LRU miss reads SQLite in a worker thread."""
+        session = self._cached(session_id)
+        if session is None and self._db is not None:
+            session = self._loaded(await asyncio.to_thread(self._read_row, session_id))
+        return session
+
+    async def append(self, session_id: str, messages: List[Dict[str, str]], model: Optional[str] = None):
+        """Append a completed turn (user delta plus assistant reply) to the history."""
+        session = await self.aget(session_id)
+        if session is None:
+            logging.warning(f"Dropping turn for unknown session {session_id}")
+            return
+        with self._lock:
+            if session_id in self._deleted:
+                logging.warning(f"Dropping turn for deleted session {session_id}")
+                return
+            session.messages.extend(messages)
+            session.model = model or session.model
+            session.updated_at = time.time()
+            self._remember(session)
+        await self._persist(session)
+
+    def _delete_row(self, session_id: str) -> bool:
+        with self._db_lock:
+            if self._db is None:
+                return False
+            deleted = self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+            self._db.commit()
+            return deleted
+
+    async def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+            # Writes queued before this point are skipped once they reach `_write`
+            self._deleted[session_id] = None
+            while len(self._deleted) > self.max_sessions:
+                self._deleted.popitem(last=False)
+        if self._db is not None:
+            found = await asyncio.to_thread(self._delete_row, session_id) or found
+        return found
+
+    def stats(self) -> dict:
+        return {"cached": len(self._sessions), "max_sessions": self.max_sessions, "persistent": self._db is not None}
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
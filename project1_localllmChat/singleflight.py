@@ -0,0 +1,127 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+
+class Flight:
+    """One running generation that any number of subscribers can read.
+
+    The source runs in its own task, so a subscriber leaving never disturbs the
+    others. Tokens are kept for the life of the flight, so a late subscriber
+    replays from the first token. The source is paced to the slowest
+    subscriber: it is not read further while any subscriber is `max_lag`
+    tokens or more behind, so a slow client still pauses the upstream stream.
+    When the last subscriber leaves before the end, the task is cancelled and
+    generation stops upstream.
+    """
+
+    def __init__(
+        self, key: str, source: AsyncIterator[str], state: Any = None, on_done: Callable = None, max_lag: int = 256
+    ):
+        self.key = key
+        self.state = state
+        self.max_lag = max_lag
+        self.tokens: List[str] = []
+        self.done = False
+        self.abandoned = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._source = source
+        self._on_done = on_done
+        self._positions: Dict[object, int] = {}  # tokens read, per subscriber
+        self._changed = asyncio.Event()
+        self._read = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _notify_read(self):
+        self._read.set()
+        self._read = asyncio.Event()
+
+    def _lag(self) -> int:
+        return len(self.tokens) - min(self._positions.values(), default=0)
+
+    async def _run(self):
+        try:
+            async for token in self._source:
+                self.tokens.append(token)
+                self._notify()
+                while self._lag() >= self.max_lag:
+                    await self._read.wait()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("generation abandoned by every subscriber")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            if self._on_done is not None:
+                self._on_done(self)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Yield every token of the flight from the start; re-raises the source's error."""
+        self.subscribers += 1
+        reader = object()
+        self._positions[reader] = 0
+        try:
+            i = 0
+            while True:
+                changed = self._changed
+                while i < len(self.tokens):
+                    yield self.tokens[i]
+                    i += 1
+                    self._positions[reader] = i
+                    self._notify_read()
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            del self._positions[reader]
+            self._notify_read()
+            if self.subscribers == 0 and not self.done:
+                # Nobody is listening any more; new requests start a fresh flight
+                self.abandoned = True
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Coalesce identical concurrent generations onto one upstream stream.
+
+    `max_lag` bounds how far a flight's source may run ahead of its slowest subscriber.
+    """
+
+    def __init__(self, max_lag: int = 256):
+        self.max_lag = max_lag
+        self.leaders = 0
+        self.followers = 0
+        self._flights: Dict[str, Flight] = {}
+
+    def _forget(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def running(self, key: str) -> bool:
+        flight = self._flights.get(key)
+        return flight is not None and not flight.done and not flight.abandoned
+
+    def join(self, key: str, start: Callable[[], AsyncIterator[str]], state: Any = None) -> Tuple[Flight, bool]:
+        """Return the running flight for `key`, or start one from `start()`.
+
+        The second value is True when this call started the flight.
+        """
+        if self.running(key):
+            flight = self._flights[key]
+            self.followers += 1
+            return flight, False
+        flight = Flight(key, start(), state=state, on_done=self._forget, max_lag=self.max_lag)
+        self._flights[key] = flight
+        self.leaders += 1
+        return flight, True
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "followers": self.followers}
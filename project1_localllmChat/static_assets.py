@@ -0,0 +1,205 @@
+"""Serve the built SPA (frontend/dist) with precompressed variants and cache headers.
+
+`npm run build` writes `.gz` (and, with the `brotli` package installed, `.br`)
+files next to every compressible asset by running this module:
+
+    python static_assets.py frontend/dist
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # optional: .br variants are only written when available
+    brotli = None
+
+# Explicit types, since mimetypes depends on the OS registry (e.g. .js as text/plain on Windows)
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".mjs": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".json": "application/json",
+    ".map": "application/json",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain; charset=utf-8",
+    ".wasm": "application/wasm",
+    ".ico": "image/x-icon",
+    ".webmanifest": "application/manifest+json",
+}
+COMPRESSIBLE = {".html", ".js", ".mjs", ".css", ".json", ".map", ".svg", ".txt", ".wasm", ".ico", ".webmanifest"}
+# Encodings in order of preference, with the file suffix of their variant
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Vite names build output like assets/index-B3xK9aQd.js; those can be cached forever
+HASHED_NAME = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$")
+
+
+@dataclass
+class _Variant:
+    path: str
+    size: int
+    etag: str
+    body: Optional[bytes] = None  # kept in memory when small
+
+
+@dataclass
+class _Asset:
+    content_type: str
+    cache_control: str
+    variants: Dict[str, _Variant]  # "identity", "gzip", "br"
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class PrecompressedStatic:
+    """Index of the files under `directory`, served with their best precompressed variant.
+
+    Each file is hashed once at scan time for a strong ETag; `.gz`/`.br`
+    siblings become alternative representations picked by Accept-Encoding.
+    Hashed build assets get a year-long immutable Cache-Control, index.html
+    `index_max_age` (revalidated with its ETag), everything else `max_age`.
+    Files up to `memory_limit` bytes are kept in memory.
+    """
+
+    def __init__(self, directory: str, index_max_age: int = 0, max_age: int = 3600, memory_limit: int = 256 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.index_max_age = index_max_age
+        self.max_age = max_age
+        self.memory_limit = memory_limit
+        self.assets: Dict[str, _Asset] = {}
+        self.not_modified = 0
+        self.served: Dict[str, int] = {"identity": 0, "gzip": 0, "br": 0}
+
+    def _cache_control(self, rel: str) -> str:
+        if rel == "index.html":
+            return f"public, max-age={self.index_max_age}, must-revalidate"
+        if rel.startswith("assets/") and HASHED_NAME.search(rel):
+            return "public, max-age=31536000, immutable"
+        return f"public, max-age={self.max_age}"
+
+    def _variant(self, path: str, tag: str) -> _Variant:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        # Strong ETags must differ between encodings of the same file
+        return _Variant(
+            path=path,
+            size=len(data),
+            etag=f'"{digest}{tag}"',
+            body=data if len(data) <= self.memory_limit else None,
+        )
+
+    def scan(self):
+        assets: Dict[str, _Asset] = {}
+        if not os.path.isdir(self.directory):
+            logging.warning(f"{self.directory} not found; build the frontend with `npm run build`")
+            self.assets = assets
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith((".gz", ".br")):
+                    continue
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                ext = os.path.splitext(name)[1].lower()
+                content_type = CONTENT_TYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+                variants = {"identity": self._variant(path, "")}
+                for coding, suffix in ENCODINGS:
+                    if os.path.isfile(path + suffix):
+                        variants[coding] = self._variant(path + suffix, suffix.replace(".", "-"))
+                assets[rel] = _Asset(content_type, self._cache_control(rel), variants)
+        self.assets = assets
+        compressed = sum(1 for a in assets.values() if len(a.variants) > 1)
+        logging.info(f"Static assets: {len(assets)} files from {self.directory} ({compressed} precompressed)")
+
+    def _choose(self, asset: _Asset, accept_encoding: str) -> str:
+        accepted = _accepted(accept_encoding)
+        for coding, _ in ENCODINGS:
+            if coding in asset.variants and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+                return coding
+        return "identity"
+
+    def serve(self, rel: str, request: Request) -> Response:
+        asset = self.assets.get(rel.lstrip("/"))
+        if asset is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+
+        coding = self._choose(asset, request.headers.get("accept-encoding", ""))
+        variant = asset.variants[coding]
+        headers = {"ETag": variant.etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match:
+            tags: List[str] = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            if "*" in tags or variant.etag in tags:
+                self.not_modified += 1
+                return Response(status_code=304, headers=headers)
+
+        self.served[coding] += 1
+        if variant.body is not None:
+            body = b"" if request.method == "HEAD" else variant.body
+            headers["Content-Length"] = str(variant.size)
+            return Response(body, media_type=asset.content_type, headers=headers)
+        return FileResponse(variant.path, media_type=asset.content_type, headers=headers)
+
+    def stats(self) -> dict:
+        return {"files": len(self.assets), "served": self.served, "not_modified": self.not_modified}
+
+
+def precompress(directory: str, min_size: int = 256) -> int:
+    """Write .gz (and .br) siblings for compressible files that shrink; returns files written."""
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < min_size:
+                continue
+            variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append((".br", brotli.compress(data, quality=11)))
+            for suffix, packed in variants:
+                if len(packed) < len(data) * 0.95:
+                    with open(path + suffix, "wb") as f:
+                        f.write(packed)
+                    written += 1
+    return written
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join("frontend", "dist")
+    count = precompress(target)
+    print(f"Wrote {count} precompressed files under {target}" + ("" if brotli else " (gzip only; pip install brotli for .br)"))
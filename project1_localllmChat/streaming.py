@@ -0,0 +1,150 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+_DONE = object()
+
+
+@dataclass
+class GenerationStats:
+    """Timing breakdown for one request, measured with `time.perf_counter()`."""
+
+    start: float = field(default_factory=time.perf_counter)
+    queue_wait: float = 0.0
+    gen_start: Optional[float] = None
+    first_token: Optional[float] = None
+    end: Optional[float] = None
+    tokens: int = 0
+    cached: Optional[str] = None
+    prompt_tokens: int = 0  # after fitting the context window
+    tokens_saved: int = 0  # prompt tokens removed by summarizing or dropping old turns
+    cold: Optional[bool] = None  # the model was not loaded on the chosen host
+    load_duration: float = 0.0  # seconds Ollama spent loading the model (its load_duration)
+
+    def begin(self, queue_wait: float = 0.0):
+        self.queue_wait = queue_wait
+        self.gen_start = time.perf_counter()
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self, tokens: Optional[int] = None):
+        """Mark the end of generation; `tokens` overrides the delta count (e.g. Ollama's eval_count)."""
+        self.end = time.perf_counter()
+        if tokens:
+            self.tokens = tokens
+
+    def timings(self) -> Dict[str, float]:
+        end = self.end or time.perf_counter()
+        generation = end - (self.gen_start or end)
+        return {
+            "queue_wait": self.queue_wait,
+            "ttft": (self.first_token or end) - self.start,
+            "generation": generation,
+            "tokens": self.tokens,
+            "tokens_per_sec": self.tokens / generation if generation > 0 else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "tokens_saved": self.tokens_saved,
+            "load_duration": self.load_duration,
+        }
+
+
+class TokenStream:
+    """Pump an async token iterator into a bounded queue and read it back in batches.
+
+    The producer task blocks when the queue is full, so a slow client applies
+    backpressure all the way to the upstream HTTP stream. `batches()` coalesces
+    whatever arrived within `window` seconds into a single frame, so the socket
+    sees one send per window instead of one per token.
+    """
+
+    def __init__(self, tokens: AsyncIterator[str], maxsize: int = 256):
+        self._tokens = tokens
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> "TokenStream":
+        self._task = asyncio.create_task(self._produce())
+        return self
+
+    async def _produce(self):
+        try:
+            async for token in self._tokens:
+                if token:
+                    await self._queue.put(token)
+            await self._queue.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._queue.put(e)
+
+    async def batches(self, window: float = 0.025, max_chars: int = 1024) -> AsyncIterator[str]:
+        """Yield coalesced token batches until the stream ends; re-raises producer errors."""
+        while True:
+            item = await self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+
+            if window > 0:
+                await asyncio.sleep(window)
+
+            parts: List[str] = [item]
+            size = len(item)
+            end = None
+            while size < max_chars and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _DONE or isinstance(item, Exception):
+                    end = item
+                    break
+                parts.append(item)
+                size += len(item)
+
+            yield "".join(parts)
+
+            if end is _DONE:
+                return
+            if end is not None:
+                raise end
+
+    async def aclose(self):
+        """Cancel the producer; this closes the upstream stream so generation stops."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        aclose = getattr(self._tokens, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
+
+
+class FlowWindow:
+    """Credit-based flow control for one multiplexed stream.
+
+    Each frame sent spends one credit; the client grants more as it consumes
+    them. A stream out of credit pauses, its TokenStream queue fills, and the
+    upstream generation is throttled without affecting the socket's other streams.
+    """
+
+    def __init__(self, credit: int):
+        self.credit = credit
+        self._granted = asyncio.Event()
+
+    async def acquire(self):
+        while self.credit <= 0:
+            self._granted.clear()
+            await self._granted.wait()
+        self.credit -= 1
+
+    def grant(self, n: int):
+        self.credit += n
+        self._granted.set()
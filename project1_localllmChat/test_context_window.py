@@ -0,0 +1,9 @@
+import app
+
+
+def test_client_num_ctx_matches_prompt_budget():
+    for model in ["llama3", "llama3:latest", "phi3", "mistral", "some-other-model"]:
+        num_ctx = app.pool.get(model)._model_kwargs["num_ctx"]
+        assert num_ctx == app.context.window(model)
+        assert app.context.budget(model) == num_ctx - app.context.reserve
+    assert app.pool.get("llama3")._model_kwargs["num_ctx"] == 8192
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+import threading
+
+import numpy as np
+import xxhash
+
+from chunking import WORD
+from profiling import stage
+
+_punkt = None
+
+
+def _sentence_tokenizer():
+    """NLTK's punkt tokenizer; its data is checked (and downloaded) on first use, not at import"""
+    global _punkt
+    if _punkt is None:
+        import nltk
+        from nltk.tokenize.punkt import PunktTokenizer
+        try:
+            nltk.data.find('tokenizers/punkt_tab')
+        except LookupError:
+            print("Downloading NLTK punkt tokenizer...")
+            nltk.download('punkt_tab')
+        _punkt = PunktTokenizer('english')
+    return _punkt
+
+
+def sentence_spans(text):
+    """(start, end) offsets of the sentences of `text`, in one pass and without copying them"""
+    tokenizer = _sentence_tokenizer()
+    with stage('segmentation'):
+        return list(tokenizer.span_tokenize(text))
+
+
+class DocumentAnalysis:
+    """Sentences of one document, their embeddings and scores, each computed at most once
+
+    Sentences are kept as (start, end) spans over the document; their strings
+    are only made when they are embedded or sent to the model. Embeddings are
+    unit length, so cosine similarity is a plain matrix product: every
+    sentence is scored against the document centroid in one `E @ c`.
+    Embedding and clustering are lazy; methods that only need the sentences
+    never load the embedding model.
+    """
+
+    def __init__(self, text, spans, sentence_model, batch_size=64):
+        self.text = text
+        self.spans = spans
+        self.sentence_model = sentence_model  # function returning the embedding model
+        self.batch_size = batch_size
+        self._sentences = None
+        self._word_counts = None
+        self._embeddings = None
+        self._scores = None
+        self._clusters = {}
+
+    def __len__(self):
+        return len(self.spans)
+
+    @property
+    def sentences(self):
+        if self._sentences is None:
+            self._sentences = [self.text[start:end] for start, end in self.spans]
+        return self._sentences
+
+    @property
+    def word_counts(self):
+        """Words per sentence, from one scan of the document for word starts"""
+        if self._word_counts is None:
+            word_starts = np.fromiter((m.start() for m in WORD.finditer(self.text)), dtype=np.int64)
+            bounds = np.asarray(self.spans, dtype=np.int64).reshape(-1, 2)
+            self._word_counts = np.searchsorted(word_starts, bounds[:, 1]) - np.searchsorted(word_starts, bounds[:, 0])
+        return self._word_counts
+
+    @property
+    def embeddings(self):
+        """(n_sentences, dim) float32 matrix of normalized sentence embeddings"""
+        if self._embeddings is None:
+            model = self.sentence_model()
+            with stage('embedding'):
+                self._embeddings = np.asarray(model.encode(
+                    self.sentences, batch_size=self.batch_size, normalize_embeddings=True,
+                    convert_to_numpy=True, show_progress_bar=False
+                ), dtype=np.float32)
+        return self._embeddings
+
+    @property
+    def scores(self):
+        """Centrality (cosine to the document centroid), weighted down by up to 30% towards the end"""
+        if self._scores is None:
+            n = len(self.spans)
+            centroid = self.embeddings.mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            similarities = self.embeddings @ (centroid / norm if norm else centroid)
+            position_weights = 1.0 - np.arange(n, dtype=np.float32) / n * 0.3
+            self._scores = similarities * position_weights
+        return self._scores
+
+    def top_sentences(self, k):
+        """Indices of the `k` best-scoring sentences, in document order"""
+        scores = self.scores
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return np.sort(top)
+
+    def clusters(self, n_clusters, random_state=42):
+        """KMeans labels of the sentence embeddings (memoized per cluster count)"""
+        if n_clusters not in self._clusters:
+            from sklearn.cluster import KMeans
+            embeddings = self.embeddings
+            with stage('clustering'):
+                kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+                self._clusters[n_clusters] = kmeans.fit_predict(embeddings)
+        return self._clusters[n_clusters]
+
+
+class AnalysisCache:
+    """LRU of DocumentAnalysis objects keyed by a hash of the document text
+
+    `sentence_model` is a function returning the embedding model, so the model
+    is only loaded when a method first needs embeddings.
+    """
+
+    def __init__(self, sentence_model, max_documents=16, batch_size=64):
+        self.sentence_model = sentence_model
+        self.max_documents = max_documents
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document):
+        key = xxhash.xxh3_128_hexdigest(document.encode('utf-8'))
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return analysis
+            self.misses += 1
+        analysis = DocumentAnalysis(document, sentence_spans(document), self.sentence_model, self.batch_size)
+        with self._lock:
+            self._entries[key] = analysis
+            while len(self._entries) > self.max_documents:
+                self._entries.popitem(last=False)
+        return analysis
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,256 @@
+"""Summarize many documents: a directory of text files or a JSONL stream.
+
+    python batch.py --input docs/ --output summaries.jsonl
+    python batch.py --input corpus.jsonl --output summaries.jsonl --method method2 --workers 2
+    cat corpus.jsonl | python batch.py --input - --output summaries.jsonl
+
+JSONL input lines are {"id": ..., "text": ..., "method": optional, "target_length": optional}.
+Every result is appended to --output as one JSON line as soon as it is done.
+Rerunning with the same --output skips documents that already have a
+summary, so an interrupted run resumes where it stopped. At the end,
+docs/sec, tokens/sec and time per stage are printed (and written to
+--report).
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import models
+from long import AdvancedDocumentSummarizer
+from long_simple import SimpleRobustSummarizer
+from summary_cache import SummaryCache
+
+METHODS = ('auto', 'smart_chunk', 'method1', 'method2', 'method3', 'method4')
+TEXT_EXTENSIONS = ('.txt', '.md')
+
+
+def read_directory(path):
+    """(id, record) for each text file under `path`, id being the relative path"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(TEXT_EXTENSIONS):
+                full = os.path.join(root, name)
+                with open(full, encoding='utf-8', errors='replace') as f:
+                    yield os.path.relpath(full, path).replace(os.sep, '/'), {'text': f.read()}
+
+
+def read_jsonl(stream):
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Skipping line {line_no}: {e}", file=sys.stderr)
+            continue
+        yield str(record.get('id', line_no)), record
+
+
+def completed_ids(path):
+    """Ids already summarized in `path`; a line cut off by a crash is truncated away"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+            data = data[:data.rfind(b'\n') + 1]
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if 'summary' in record:  # failed documents are retried
+            done.add(str(record['id']))
+    return done
+
+
+class BatchRunner:
+    """Documents from a bounded queue to `workers` threads sharing one set of models
+
+    The shared pipeline, tokenizer and embedding model are called by one
+    thread at a time (see models.Serialized); extra workers overlap cleaning,
+    segmentation, scoring and summary-cache lookups with generation, not two
+    generations with each other.
+    """
+
+    def __init__(self, method='auto', target_length=200, workers=1, cache=None, backend=None,
+                 model_name="facebook/bart-large-cnn"):
+        cache = SummaryCache(cache) if cache else None
+        self.simple = SimpleRobustSummarizer(model_name, cache=cache, backend=backend)
+        self.advanced = AdvancedDocumentSummarizer(model_name, cache=cache, backend=backend)
+        self.method = method
+        self.target_length = target_length
+        self.workers = max(1, workers)
+        self.stages = {}
+        self.methods = {}
+        self.docs = 0
+        self.failed = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def _timed(self, stage, started):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - started
+
+    def choose_method(self, text, tokens):
+        """Direct summary when it fits one window, paragraph-wise for structured text, else extract first"""
+        window = self.simple.chunker.max_tokens
+        if tokens <= window or tokens > 8 * window:
+            return 'smart_chunk'  # summarizes directly, or chunks and reduces book-length text
+        if text.count('\n\n') >= 2:
+            return 'method1'
+        return 'method2'
+
+    def summarize(self, text, method, target_length):
+        if method == 'smart_chunk':
+            return self.simple.smart_chunk_summarization(text, target_length)
+        if method == 'method1':
+            return self.advanced.method1_hierarchical_summarization(text, target_length)
+        if method == 'method2':
+            return self.advanced.method2_extractive_then_abstractive(text, target_length)
+        if method == 'method3':
+            return self.advanced.method3_topic_aware_summarization(text, target_length)
+        return self.advanced.method4_map_reduce_summarization(text, target_length, workers=1)
+
+    def process(self, doc_id, record):
+        text = record.get('text') or ''
+        started = time.perf_counter()
+        tokens = self.simple.chunker.count(text)
+        method = record.get('method') or self.method
+        if method == 'auto':
+            method = self.choose_method(text, tokens)
+        self._timed('tokenize', started)
+        if method not in METHODS:
+            return {'id': doc_id, 'method': method, 'error': f"unknown method {method!r}"}
+
+        started = time.perf_counter()
+        try:
+            summary = self.summarize(text, method, int(record.get('target_length') or self.target_length))
+        except Exception as e:
+            return {'id': doc_id, 'method': method, 'error': f"{type(e).__name__}: {e}"}
+        finally:
+            self._timed('summarize', started)
+            self._timed(f'summarize.{method}', started)
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self.tokens += tokens
+            self.methods[method] = self.methods.get(method, 0) + 1
+        return {'id': doc_id, 'method': method, 'tokens': tokens, 'seconds': round(seconds, 3), 'summary': summary}
+
+    def run(self, documents, output, skip=()):
+        """Summarize (id, record) pairs into the JSONL file `output`; returns the report"""
+        jobs = queue.Queue(maxsize=self.workers * 2)  # bounded, so huge inputs are not read ahead
+        results = queue.Queue()
+
+        def worker():
+            while True:
+                item = jobs.get()
+                if item is None:
+                    break
+                try:
+                    results.put(self.process(*item))
+                except Exception as e:
+                    results.put({'id': item[0], 'error': f"{type(e).__name__}: {e}"})
+
+        def writer():
+            with open(output, 'a', encoding='utf-8') as f:
+                while True:
+                    result = results.get()
+                    if result is None:
+                        break
+                    started = time.perf_counter()
+                    f.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    f.flush()
+                    self._timed('write', started)
+                    self.docs += 1
+                    self.failed += 'error' in result
+                    status = result.get('error') or f"{result['method']}, {result['seconds']}s"
+                    print(f"[{self.docs}] {result['id']}: {status}", file=sys.stderr)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        for thread in threads + [writer_thread]:
+            thread.start()
+
+        started = time.perf_counter()
+        skipped = 0
+        documents = iter(documents)
+        while True:
+            read_started = time.perf_counter()
+            item = next(documents, None)
+            self._timed('read', read_started)
+            if item is None:
+                break
+            if item[0] in skip:
+                skipped += 1
+                continue
+            jobs.put(item)
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+        results.put(None)
+        writer_thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'docs': self.docs,
+            'failed': self.failed,
+            'skipped': skipped,
+            'tokens': self.tokens,
+            'seconds': round(elapsed, 2),
+            'docs_per_sec': round(self.docs / elapsed, 3) if elapsed else 0.0,
+            'tokens_per_sec': round(self.tokens / elapsed, 1) if elapsed else 0.0,
+            'methods': self.methods,
+            'stages': {stage: round(seconds, 2) for stage, seconds in sorted(self.stages.items())},
+            'models': models.memory_report(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', required=True, help='directory of .txt/.md files, a .jsonl file, or - for stdin')
+    parser.add_argument('--output', required=True, help='JSONL file results are appended to')
+    parser.add_argument('--method', choices=METHODS, default='auto')
+    parser.add_argument('--target-length', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='threads sharing the loaded models (model calls take turns)')
+    parser.add_argument('--cache', help='summary cache file (see summary_cache.py)')
+    parser.add_argument('--backend', choices=models.BACKENDS, default=None)
+    parser.add_argument('--model', default='facebook/bart-large-cnn')
+    parser.add_argument('--report', help='write the throughput report here as JSON')
+    args = parser.parse_args()
+
+    skip = completed_ids(args.output)
+    if skip:
+        print(f"Resuming: {len(skip)} documents already in {args.output}", file=sys.stderr)
+
+    runner = BatchRunner(args.method, args.target_length, args.workers, args.cache, args.backend, args.model)
+    if args.input == '-':
+        report = runner.run(read_jsonl(sys.stdin), args.output, skip)
+    elif os.path.isdir(args.input):
+        report = runner.run(read_directory(args.input), args.output, skip)
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            report = runner.run(read_jsonl(f), args.output, skip)
+
+    print(f"\n{report['docs']} documents ({report['failed']} failed, {report['skipped']} skipped) "
+          f"in {report['seconds']}s: {report['docs_per_sec']} docs/sec, {report['tokens_per_sec']} tokens/sec",
+          file=sys.stderr)
+    for stage, seconds in report['stages'].items():
+        print(f"  {stage:<22} {seconds:>9.2f}s", file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
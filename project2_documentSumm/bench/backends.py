@@ -0,0 +1,119 @@
+"""Compare the summarization backends (torch fp32, int8, onnx) on CPU.
+
+Each backend runs in its own subprocess so its resident memory is measured in
+isolation. The report has load time, latency (median and worst of `--runs`),
+peak RSS, and the ROUGE of each backend's summary against the fp32 one
+(1.0 = identical).
+
+    python bench/backends.py --runs 5 --out backend_results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(HERE)
+sys.path.insert(0, PROJECT_DIR)
+
+from rouge import rouge
+
+
+def rss_mb():
+    """(current, peak) resident memory of this process in MB; None where unsupported"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 2**20 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+    except ImportError:
+        peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        current = None
+    return current, peak
+
+
+def run_backend(backend, model_name, runs, max_length, min_length):
+    """Load `backend`, summarize the sample `runs` times, return measurements (runs in the subprocess)"""
+    import torch
+    import models
+    from app import text
+
+    torch.set_num_threads(os.cpu_count() or 1)
+    rss_before, _ = rss_mb()
+    started = time.perf_counter()
+    summarizer = models.summarization_pipeline(model_name, device=-1, backend=backend)
+    load_seconds = time.perf_counter() - started
+    rss_loaded, _ = rss_mb()
+
+    latencies, summary = [], ""
+    for _ in range(runs + 1):
+        started = time.perf_counter()
+        summary = summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)[0]['summary_text']
+        latencies.append(time.perf_counter() - started)
+    latencies = latencies[1:]  # the first call includes one-off graph / allocator warm-up
+
+    rss_after, rss_peak = rss_mb()
+    info = next(iter(models.memory_report().values()), {})
+    return {
+        'backend': backend,
+        'load_seconds': round(load_seconds, 2),
+        'latency_median': round(statistics.median(latencies), 3),
+        'latency_max': round(max(latencies), 3),
+        'weights_mb': round(info.get('bytes', 0) / 2**20, 1),
+        'rss_model_mb': round(rss_loaded - rss_before, 1) if rss_loaded and rss_before else None,
+        'rss_mb': round(rss_after, 1) if rss_after else None,
+        'rss_peak_mb': round(rss_peak, 1) if rss_peak else None,
+        'summary': summary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='torch,int8,onnx')
+    parser.add_argument('--model', default='facebook/bart-large-cnn')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-length', type=int, default=150)
+    parser.add_argument('--min-length', type=int, default=30)
+    parser.add_argument('--out', help='write the JSON report here as well')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.model, args.runs, args.max_length, args.min_length)))
+        return
+
+    results = []
+    for backend in args.backends.split(','):
+        print(f"Benchmarking {backend}...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', backend, '--model', args.model,
+             '--runs', str(args.runs), '--max-length', str(args.max_length), '--min-length', str(args.min_length)],
+            cwd=PROJECT_DIR, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            error = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+            print(f"  {backend}: {error}", file=sys.stderr)
+            results.append({'backend': backend, 'error': error})
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    reference = next((r['summary'] for r in results if r['backend'] == 'torch' and 'summary' in r), None)
+    for result in results:
+        if reference is not None and 'summary' in result:
+            result['vs_fp32'] = rouge(reference, result['summary'])
+
+    report = {'model': args.model, 'runs': args.runs, 'cpus': os.cpu_count(), 'results': results}
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
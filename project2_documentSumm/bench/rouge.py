@@ -0,0 +1,46 @@
+"""ROUGE-1/2/L F1 without extra dependencies (lowercased, punctuation-stripped tokens, no stemming)."""
+import re
+from collections import Counter
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokens(text):
+    return _TOKEN.findall(text.lower())
+
+
+def _f1(overlap, candidate_total, reference_total):
+    if not overlap or not candidate_total or not reference_total:
+        return 0.0
+    precision, recall = overlap / candidate_total, overlap / reference_total
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_n(reference, candidate, n=1):
+    ref, cand = tokens(reference), tokens(candidate)
+    ref_grams = Counter(tuple(ref[i:i + n]) for i in range(len(ref) - n + 1))
+    cand_grams = Counter(tuple(cand[i:i + n]) for i in range(len(cand) - n + 1))
+    overlap = sum((ref_grams & cand_grams).values())
+    return _f1(overlap, sum(cand_grams.values()), sum(ref_grams.values()))
+
+
+def rouge_l(reference, candidate):
+    """F1 over the longest common subsequence of tokens"""
+    ref, cand = tokens(reference), tokens(candidate)
+    if not ref or not cand:
+        return 0.0
+    previous = [0] * (len(cand) + 1)
+    for r in ref:
+        current = [0]
+        for j, c in enumerate(cand):
+            current.append(previous[j] + 1 if r == c else max(previous[j + 1], current[j]))
+        previous = current
+    return _f1(previous[-1], len(cand), len(ref))
+
+
+def rouge(reference, candidate):
+    return {
+        'rouge1': round(rouge_n(reference, candidate, 1), 4),
+        'rouge2': round(rouge_n(reference, candidate, 2), 4),
+        'rougeL': round(rouge_l(reference, candidate), 4),
+    }
@@ -0,0 +1,256 @@
+"""Benchmark the summarization methods across document sizes: time per stage, peak memory and ROUGE.
+
+The corpus is the bundled samples (app.py's text and long.py's
+SAMPLE_DOCUMENT, with hand-written references in references.json), synthetic
+documents of each `--sizes` word count, and optionally `--corpus` JSONL lines
+{"id", "text", "reference"}. Synthetic documents are generated from a fixed
+seed; their reference is the topic sentence of every paragraph.
+
+Each method runs in its own subprocess, so its peak RSS includes exactly the
+models it needs. Peak RSS is reported once per method: the OS high-water mark
+only grows, so it cannot be split by document. Each document instead records
+`rss_delta_mb`, the change in current RSS across its run (memory it left
+allocated, not its peak). Models are loaded (and warmed up) before timing starts.
+Stages are segmentation, tokenization, embedding, clustering and generation
+(see profiling.py). The JSON report is written with sorted keys and no
+timestamps, so reports from two commits diff cleanly; `--baseline` prints
+the change against an earlier report.
+
+    python bench/suite.py --sizes 500,2000,8000 --out bench_report.json
+    python bench/suite.py --methods method1,method2 --baseline bench_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(HERE)
+sys.path.insert(0, PROJECT_DIR)
+
+from backends import rss_mb
+from rouge import rouge
+
+METHODS = ('smart_chunk', 'method1', 'method2', 'method3', 'method4')
+
+_TOPICS = [
+    ("solar", "The city council approved a solar farm on the old airfield", ["panels", "grid", "megawatts", "storage", "rooftops"]),
+    ("rail", "A new rail line will connect the harbour to the northern suburbs", ["stations", "commuters", "tracks", "tunnel", "fares"]),
+    ("school", "The district opened three schools to relieve crowded classrooms", ["teachers", "pupils", "budget", "curriculum", "buses"]),
+    ("flood", "Heavy spring floods damaged farms along the river valley", ["levees", "crops", "insurance", "rainfall", "evacuation"]),
+    ("hospital", "The regional hospital expanded its emergency department", ["nurses", "beds", "ambulances", "waiting", "surgery"]),
+    ("festival", "The summer music festival drew record crowds to the park", ["stages", "tickets", "volunteers", "bands", "vendors"]),
+    ("bridge", "Engineers closed the old bridge after finding corroded cables", ["detour", "inspection", "steel", "traffic", "repairs"]),
+    ("library", "The public library launched a free digital lending service", ["ebooks", "members", "archives", "readers", "branches"]),
+]
+_FILLER = [
+    "Officials said the {w1} would be reviewed again next year.",
+    "Residents asked how the {w1} and the {w2} would affect them.",
+    "A report found that {w1} had risen steadily over the last decade.",
+    "Critics argued the plan for {w1} ignored the cost of {w2}.",
+    "Supporters pointed to similar {w1} projects in neighbouring towns.",
+    "The committee will publish figures on {w1} and {w2} in the autumn.",
+    "Local businesses expect the {w1} to bring more customers.",
+    "Several experts questioned whether the {w1} was large enough.",
+]
+
+
+def synthetic_document(words, seed=0):
+    """(text, reference) of about `words` words: paragraphs on rotating topics, each led by its topic sentence"""
+    rng = random.Random(seed + words)
+    paragraphs, reference, count = [], [], 0
+    while count < words:
+        _, lead, vocab = _TOPICS[len(paragraphs) % len(_TOPICS)]
+        sentences = [lead + "."]
+        for _ in range(rng.randint(5, 9)):
+            w1, w2 = rng.sample(vocab, 2)
+            sentences.append(rng.choice(_FILLER).format(w1=w1, w2=w2))
+        paragraph = ' '.join(sentences)
+        paragraphs.append(paragraph)
+        reference.append(lead + ".")
+        count += len(paragraph.split())
+    return '\n\n'.join(paragraphs), ' '.join(reference)
+
+
+def build_corpus(sizes, extra=None):
+    """[{'id', 'text', 'reference'}]: bundled samples, synthetic documents per size, then `extra`"""
+    from app import text
+    from long import SAMPLE_DOCUMENT
+
+    with open(os.path.join(HERE, 'references.json'), encoding='utf-8') as f:
+        references = json.load(f)
+    corpus = [
+        {'id': 'bundled/app.text', 'text': text, 'reference': references['app.text']},
+        {'id': 'bundled/long.SAMPLE_DOCUMENT', 'text': SAMPLE_DOCUMENT, 'reference': references['long.SAMPLE_DOCUMENT']},
+    ]
+    for size in sizes:
+        document, reference = synthetic_document(size)
+        corpus.append({'id': f'synthetic/{size:06d}', 'text': document, 'reference': reference})
+    if extra:
+        with open(extra, encoding='utf-8') as f:
+            corpus.extend(json.loads(line) for line in f if line.strip())
+    return corpus
+
+
+def run_method(method, corpus_path, target_length, backend, keep_summaries):
+    """Summarize every document of the corpus with `method` (runs in the subprocess)"""
+    import profiling
+    from long import AdvancedDocumentSummarizer
+    from long_simple import SimpleRobustSummarizer
+
+    if method == 'smart_chunk':
+        summarizer = SimpleRobustSummarizer(backend=backend)
+        summarize = summarizer.smart_chunk_summarization
+    else:
+        summarizer = AdvancedDocumentSummarizer(backend=backend)
+        summarize = {
+            'method1': summarizer.method1_hierarchical_summarization,
+            'method2': summarizer.method2_extractive_then_abstractive,
+            'method3': summarizer.method3_topic_aware_summarization,
+            'method4': lambda doc, target: summarizer.method4_map_reduce_summarization(doc, target, workers=1),
+        }[method]
+
+    with open(corpus_path, encoding='utf-8') as f:
+        corpus = [json.loads(line) for line in f]
+
+    # Load every model the method uses, outside the timed runs
+    started = time.perf_counter()
+    warmup, _ = synthetic_document(300, seed=1)
+    summarize(warmup, target_length)
+    load_seconds = time.perf_counter() - started
+
+    docs = {}
+    for doc in corpus:
+        rss_before, _ = rss_mb()
+        with profiling.collect() as stages:
+            started = time.perf_counter()
+            summary = summarize(doc['text'], target_length)
+            seconds = time.perf_counter() - started
+        rss_after, _ = rss_mb()
+        result = {
+            'words': len(doc['text'].split()),
+            'seconds': round(seconds, 3),
+            'stages': {name: round(entry['seconds'], 3) for name, entry in stages.items()},
+            'rss_delta_mb': round(rss_after - rss_before, 1) if rss_after and rss_before else None,
+        }
+        if doc.get('reference'):
+            result['rouge'] = rouge(doc['reference'], summary)
+        if keep_summaries:
+            result['summary'] = summary
+        docs[doc['id']] = result
+        print(f"  {method} {doc['id']}: {seconds:.2f}s", file=sys.stderr)
+
+    _, peak = rss_mb()
+    return {'load_seconds': round(load_seconds, 2), 'peak_rss_mb': round(peak, 1) if peak else None, 'docs': docs}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _cell(new, old, fmt):
+    """`new`, followed by its change from `old` when there is one"""
+    if new is None:
+        return '-'
+    if old is None:
+        return format(new, fmt)
+    return f"{format(new, fmt)} ({new - old:+{fmt}})"
+
+
+def print_comparison(report, baseline):
+    """Seconds and ROUGE-L per method and document, and peak RSS per method, against `baseline`"""
+    print(f"\n{'method':<12} {'document':<32} {'seconds':>16} {'rougeL':>16} {'RSS delta MB':>16}", file=sys.stderr)
+    for method, result in sorted(report['results'].items()):
+        old_result = baseline.get('results', {}).get(method, {})
+        old_docs = old_result.get('docs', {})
+        for doc_id, doc in sorted(result.get('docs', {}).items()):
+            old = old_docs.get(doc_id, {})
+            print(f"{method:<12} {doc_id:<32} "
+                  f"{_cell(doc['seconds'], old.get('seconds'), '.2f'):>16} "
+                  f"{_cell(doc.get('rouge', {}).get('rougeL'), old.get('rouge', {}).get('rougeL'), '.3f'):>16} "
+                  f"{_cell(doc.get('rss_delta_mb'), old.get('rss_delta_mb'), '.0f'):>16}", file=sys.stderr)
+        print(f"{method:<12} {'(peak RSS MB)':<32} {'':>16} {'':>16} "
+              f"{_cell(result.get('peak_rss_mb'), old_result.get('peak_rss_mb'), '.0f'):>16}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', default='smart_chunk,method1,method2,method3')
+    parser.add_argument('--sizes', default='500,2000,8000', help='synthetic document sizes in words')
+    parser.add_argument('--corpus', help='extra JSONL documents {"id", "text", "reference"}')
+    parser.add_argument('--target-length', type=int, default=150)
+    parser.add_argument('--backend', default=None, help='summarization backend: torch, int8 or onnx')
+    parser.add_argument('--summaries', action='store_true', help='include the summaries in the report')
+    parser.add_argument('--out', default='bench_report.json')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--corpus-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_method(args.worker, args.corpus_file, args.target_length, args.backend, args.summaries)))
+        return
+
+    methods = [m for m in args.methods.split(',') if m]
+    unknown = [m for m in methods if m not in METHODS]
+    if unknown:
+        parser.error(f"unknown methods: {', '.join(unknown)} (choose from {', '.join(METHODS)})")
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    corpus = build_corpus(sizes, args.corpus)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as f:
+        for doc in corpus:
+            f.write(json.dumps(doc) + '\n')
+        corpus_file = f.name
+
+    results = {}
+    try:
+        for method in methods:
+            print(f"Benchmarking {method} on {len(corpus)} documents...", file=sys.stderr)
+            command = [sys.executable, os.path.abspath(__file__), '--worker', method, '--corpus-file', corpus_file,
+                       '--target-length', str(args.target_length)]
+            if args.backend:
+                command += ['--backend', args.backend]
+            if args.summaries:
+                command.append('--summaries')
+            proc = subprocess.run(command, cwd=PROJECT_DIR, stdout=subprocess.PIPE, text=True)
+            if proc.returncode != 0 or not proc.stdout.strip():
+                results[method] = {'error': f"worker exited with {proc.returncode}"}
+                continue
+            results[method] = json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        os.remove(corpus_file)
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'backend': args.backend or os.getenv('SUMMARIZER_BACKEND', 'torch'),
+            'target_length': args.target_length,
+            'corpus': {doc['id']: len(doc['text'].split()) for doc in corpus},
+        },
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"Wrote {args.out}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import re
+import zlib
+from bisect import bisect_left
+
+from profiling import stage
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+WORD = re.compile(r'\S+')
+NON_BLANK = re.compile(r'\S')
+
+
+class Segmentation:
+    """Token and word positions of one text, so any span's counts are two binary searches
+
+    Spans are (start, end) character offsets into `text`; nothing is sliced or
+    re-split to count it. Word positions (whitespace-separated, like
+    `len(x.split())`) are found on first use.
+    """
+
+    def __init__(self, text, token_starts):
+        self.text = text
+        self.token_starts = token_starts
+        self._word_starts = None
+
+    @property
+    def word_starts(self):
+        if self._word_starts is None:
+            self._word_starts = [m.start() for m in WORD.finditer(self.text)]
+        return self._word_starts
+
+    def tokens(self, start=0, end=None):
+        end = len(self.text) if end is None else end
+        return bisect_left(self.token_starts, end) - bisect_left(self.token_starts, start)
+
+    def words(self, start=0, end=None):
+        end = len(self.text) if end is None else end
+        return bisect_left(self.word_starts, end) - bisect_left(self.word_starts, start)
+
+    def slice(self, start, end):
+        """The text of a span, without its surrounding whitespace (for sending to the model)"""
+        return self.text[start:end].strip()
+
+
+class TokenChunker:
+    """Pack text into chunks that fill the model's input window, by real token counts.
+
+    The document is tokenized once with a fast tokenizer; the offset mapping
+    gives every token's character position, so the token count of any span of
+    the text is two binary searches. Chunks are packed from whole sentences (or
+    whole paragraphs, with `paragraphs=True`) up to `max_tokens`; only a single
+    sentence longer than the window is cut, at token boundaries.
+
+    Greedy packing alone would let an edit that changes one sentence's length
+    move every later chunk boundary. So some units are content-defined cut
+    points: a hash of the unit's text picks about one every
+    `anchor_windows * max_tokens` tokens. A chunk always ends after a cut
+    point, and the next chunk starts fresh from the following unit. Packing
+    therefore re-synchronizes at the first cut point after an edit, and chunks
+    further on keep their exact text (and their summary-cache entries).
+    `anchor_windows=0` packs purely greedily.
+    """
+
+    def __init__(self, tokenizer, max_tokens=None, overlap_sentences=2, margin=8, anchor_windows=4):
+        self.tokenizer = tokenizer
+        limit = max_tokens or getattr(tokenizer, 'model_max_length', 1024)
+        if limit > 100000:  # tokenizers without a configured limit report a huge sentinel
+            limit = 1024
+        # Room for <s> </s> and a little slack, since a chunk re-tokenized on its own
+        # can differ by a token at its edges
+        self.max_tokens = limit - tokenizer.num_special_tokens_to_add() - margin
+        self.overlap_sentences = overlap_sentences
+        self.anchor_tokens = anchor_windows * self.max_tokens
+
+    def token_starts(self, text):
+        """Character offset of every token of `text` (one tokenizer pass)"""
+        with stage('tokenization'):
+            encoding = self.tokenizer(
+                text, add_special_tokens=False, return_offsets_mapping=True, truncation=False, verbose=False
+            )
+            return [start for start, end in encoding['offset_mapping']]
+
+    def count(self, text):
+        return len(self.token_starts(text))
+
+    def segment(self, text):
+        """Segmentation of `text` (one tokenizer pass)"""
+        return Segmentation(text, self.token_starts(text))
+
+    @staticmethod
+    def _spans(text, pattern, start=0, end=None):
+        """(start, end) spans of the non-blank pieces of text[start:end] between `pattern` matches"""
+        end = len(text) if end is None else end
+        spans = []
+        pos = start
+        for match in pattern.finditer(text, start, end):
+            if NON_BLANK.search(text, pos, match.start()):
+                spans.append((pos, match.start()))
+            pos = match.end()
+        if NON_BLANK.search(text, pos, end):
+            spans.append((pos, end))
+        return spans
+
+    def _units(self, text, starts, paragraphs):
+        """Spans to pack, with their token counts; oversized units are split further"""
+        def tokens_in(a, b):
+            return bisect_left(starts, b) - bisect_left(starts, a)
+
+        units = []
+        outer = self._spans(text, PARAGRAPH_BREAK) if paragraphs else [(0, len(text))]
+        for p_start, p_end in outer:
+            n = tokens_in(p_start, p_end)
+            if paragraphs and n <= self.max_tokens:
+                units.append((p_start, p_end, n))
+                continue
+            for s_start, s_end in self._spans(text, SENTENCE_END, p_start, p_end):
+                n = tokens_in(s_start, s_end)
+                if n <= self.max_tokens:
+                    units.append((s_start, s_end, n))
+                    continue
+                # A "sentence" longer than the window: cut it at token boundaries
+                first, last = bisect_left(starts, s_start), bisect_left(starts, s_end)
+                for i in range(first, last, self.max_tokens):
+                    j = min(i + self.max_tokens, last)
+                    units.append((starts[i], starts[j] if j < last else s_end, j - i))
+        return units
+
+    def chunk_spans(self, text, paragraphs=False, starts=None):
+        """(start, end, tokens) of each chunk; consecutive sentence chunks overlap"""
+        starts = self.token_starts(text) if starts is None else starts
+        with stage('segmentation'):
+            return self._pack(text, starts, paragraphs)
+
+    def _cut_points(self, text, units):
+        """Whether each unit is a cut point: chosen by its text alone, with odds proportional to its tokens"""
+        if not self.anchor_tokens:
+            return [False] * len(units)
+        scale = 2 ** 32 / self.anchor_tokens
+        return [zlib.crc32(text[start:end].encode('utf-8')) < n * scale for start, end, n in units]
+
+    def _pack(self, text, starts, paragraphs):
+        units = self._units(text, starts, paragraphs)
+        cuts = self._cut_points(text, units)
+        overlap = 0 if paragraphs else self.overlap_sentences
+
+        chunks = []
+        first = 0
+        while first < len(units):
+            last, used = first, 0
+            while last < len(units) and used + units[last][2] <= self.max_tokens:
+                used += units[last][2]
+                last += 1
+                if cuts[last - 1]:
+                    break
+            last = max(last, first + 1)
+            chunks.append((units[first][0], units[last - 1][1], used or units[first][2]))
+            if last >= len(units):
+                break
+            if cuts[last - 1]:
+                # Nothing is carried over a cut point, so what follows does not depend on what came before
+                first = last
+                continue
+            # Carry the last few sentences over for context, if they leave room for new text
+            carry = min(overlap, last - first - 1)
+            while carry and sum(u[2] for u in units[last - carry:last]) > self.max_tokens // 4:
+                carry -= 1
+            first = last - carry
+        return chunks
+
+    def chunk(self, text, paragraphs=False):
+        """Chunk strings of `text`, each within max_tokens"""
+        return [text[start:end] for start, end, _ in self.chunk_spans(text, paragraphs)]
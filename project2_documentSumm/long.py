@@ -1,81 +1,141 @@
-from transformers import pipeline, AutoTokenizer
-import torch
-from sentence_transformers import SentenceTransformer
-import numpy as np
-from sklearn.cluster import KMeans
-import nltk
-from nltk.tokenize import sent_tokenize
-from transformers.utils import logging
-logging.set_verbosity_error()
+from functools import partial
 
+import numpy as np
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    print("Downloading NLTK punkt tokenizer...")
-    nltk.download('punkt')
+import models
+from analysis import AnalysisCache
+from chunking import TokenChunker
+from mapreduce import MapReduceSummarizer, reduce_summaries, summarize_texts
+from profiling import Timed
+from streaming import iter_chunks, read_blocks, stream_summaries
+from summary_cache import SummaryCache, with_cache
 
 
 class AdvancedDocumentSummarizer:
-    def __init__(self, model_name="facebook/bart-large-cnn", debug=False):
-        self.device = 0 if torch.cuda.is_available() else -1
+    """Models come from the process-wide registry (models.py) and load on first use,
+    so construction is instant and a method only waits for the models it needs."""
+
+    def __init__(self, model_name="facebook/bart-large-cnn", debug=False, cache=None,
+                 sentence_model_name='all-MiniLM-L6-v2', backend=None):
+        self.model_name = model_name
+        # 'torch' (default), or 'int8' / 'onnx' for faster CPU inference (see models.summarization_pipeline)
+        self.backend = backend
+        self.sentence_model_name = sentence_model_name
         self.debug = debug
-
-        if self.debug:
-            print("Loading summarizer and tokenizer...")
-        self.summarizer = pipeline('summarization', model=model_name, device=self.device)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-
-        if self.debug:
+        # cache: a SummaryCache or the path of one; unchanged chunks are then never re-summarized
+        self.cache = SummaryCache(cache) if cache and not isinstance(cache, SummaryCache) else cache
+        self._summarizer = None
+        self._chunker = None
+        self._map_reduce = None
+        # Sentences, embeddings and clusters per document, shared by methods 2 and 3
+        self.analyses = AnalysisCache(lambda: self.sentence_model)
+
+    @property
+    def summarizer(self):
+        if self._summarizer is None:
+            if self.debug:
+                print("Loading summarizer...")
+            self._summarizer = with_cache(
+                Timed(models.summarization_pipeline(self.model_name, backend=self.backend), 'generation'),
+                self.cache, models.backend_name(self.model_name, self.backend)
+            )
+        return self._summarizer
+
+    @property
+    def tokenizer(self):
+        return models.tokenizer(self.model_name)
+
+    @property
+    def chunker(self):
+        if self._chunker is None:
+            self._chunker = TokenChunker(self.tokenizer)
+        return self._chunker
+
+    @property
+    def sentence_model(self):
+        if self.debug and not models.registry.loaded(('sentence', self.sentence_model_name)):
             print("Loading sentence embedding model...")
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+        return models.sentence_model(self.sentence_model_name)
+
+    def analyze(self, document):
+        """The (cached) DocumentAnalysis of `document`"""
+        return self.analyses.get(document)
 
     def method1_hierarchical_summarization(self, document, target_length=200):
         if self.debug:
             print("\n🔄 Using Hierarchical Summarization...")
 
-        sections = [p.strip() for p in document.split('\n\n') if p.strip()]
-        if len(sections) <= 2:
+        # Whole paragraphs packed up to the model window (by token count), as spans with word counts
+        segmentation = self.chunker.segment(document)
+        spans = self.chunker.chunk_spans(document, paragraphs=True, starts=segmentation.token_starts)
+        if len(spans) <= 1:
             return self._direct_summarize(document, target_length)
 
         section_summaries = []
-        for i, section in enumerate(sections):
-            if len(section.split()) > 50:
+        for i, (start, end, _) in enumerate(spans):
+            word_count = segmentation.words(start, end)
+            if word_count > 50:
+                section = segmentation.slice(start, end)
                 try:
-                    max_len = min(100, max(30, len(section.split()) // 3))
+                    max_len = min(100, max(30, word_count // 3))
                     min_len = min(15, max_len - 5)
                     summary = self.summarizer(section, max_length=max_len, min_length=min_len, do_sample=False)[0]['summary_text']
                     section_summaries.append(summary)
                 except Exception as e:
                     if self.debug:
                         print(f"Warning: Could not summarize section {i+1}: {e}")
-                    words = section.split()
-                    section_summaries.append(' '.join(words[:50]) + "..." if len(words) > 50 else section)
+                    section_summaries.append(' '.join(section.split()[:50]) + "...")
 
         combined = self._add_transitions(section_summaries)
+        if self.chunker.count(combined) > self.chunker.max_tokens:
+            # Too many sections for one final pass: reduce the summaries recursively
+            run = lambda texts, max_len, min_len: summarize_texts(self.summarizer, texts, max_len, min_len)
+            return reduce_summaries(run, self.chunker, section_summaries, target_length)
         if len(combined.split()) > target_length:
             return self._direct_summarize(combined, target_length)
         return combined
 
+    def method4_map_reduce_summarization(self, document, target_length=200, workers=None, fan_in=4, max_depth=5):
+        """Recursive map-reduce over a process pool, for documents many windows long"""
+        if self.debug:
+            print("\n🔄 Using Map-Reduce Summarization...")
+
+        settings = (workers, fan_in, max_depth)
+        if self._map_reduce is None or self._map_reduce_settings != settings:
+            if self._map_reduce is not None:
+                self._map_reduce.close()
+            # Single-process runs share this process's pipeline through the model registry
+            self._map_reduce = MapReduceSummarizer(
+                model_name=self.model_name, backend=self.backend, workers=workers, fan_in=fan_in, max_depth=max_depth,
+                tokenizer=self.tokenizer, cache=self.cache,
+            )
+            self._map_reduce_settings = settings
+
+        summary = self._map_reduce.summarize(document, target_length)
+        if self.debug:
+            for level in self._map_reduce.levels:
+                print(f"  level {level['level']}: {level['inputs']} -> {level['outputs']} in {level['seconds']:.2f}s")
+        return summary
+
+    def summarize_file(self, path, target_length=200, batch_size=4, block_size=256 * 1024):
+        """Streaming summary of a text file too big to hold in memory; yields progress events, then the final one"""
+        run = partial(summarize_texts, self.summarizer, batch_size=batch_size)
+        chunks = iter_chunks(read_blocks(path, block_size), self.chunker)
+        for event in stream_summaries(chunks, run, self.chunker, target_length, batch_size):
+            if self.debug and event['stage'] != 'final':
+                print(f"  {event['stage']}: {event.get('index', event.get('level'))}")
+            yield event
+
     def method2_extractive_then_abstractive(self, document, target_length=200):
         if self.debug:
             print("\n🔄 Using Extractive + Abstractive Summarization...")
 
-        sentences = sent_tokenize(document)
-        if len(sentences) <= 5:
+        analysis = self.analyze(document)
+        if len(analysis) <= 5:
             return self._direct_summarize(document, target_length)
 
-        sentence_embeddings = self.sentence_model.encode(sentences)
-        doc_embedding = np.mean(sentence_embeddings, axis=0)
-
-        similarities = [np.dot(emb, doc_embedding) / (np.linalg.norm(emb) * np.linalg.norm(doc_embedding)) for emb in sentence_embeddings]
-        position_weights = [1.0 - (i / len(sentences)) * 0.3 for i in range(len(sentences))]
-        combined_scores = [sim * pos for sim, pos in zip(similarities, position_weights)]
-
-        top_indices = sorted(range(len(combined_scores)), key=lambda i: combined_scores[i], reverse=True)[:min(len(sentences) // 2, 8)]
-        top_indices.sort()
-        key_sentences = [sentences[i] for i in top_indices]
+        top_indices = analysis.top_sentences(min(len(analysis) // 2, 8))
+        key_sentences = [analysis.sentences[i] for i in top_indices]
 
         return self._direct_summarize(' '.join(key_sentences), target_length)
 
@@ -83,48 +143,37 @@ class AdvancedDocumentSummarizer:
         if self.debug:
             print("\n🔄 Using Topic-Aware Summarization...")
 
-        sentences = sent_tokenize(document)
-        if len(sentences) <= 6:
+        analysis = self.analyze(document)
+        if len(analysis) <= 6:
             return self._direct_summarize(document, target_length)
 
-        sentence_embeddings = self.sentence_model.encode(sentences)
-        n_clusters = min(max(2, len(sentences) // 4), 4)
+        n_clusters = min(max(2, len(analysis) // 4), 4)
 
         try:
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-            clusters = kmeans.fit_predict(sentence_embeddings)
+            clusters = analysis.clusters(n_clusters)
         except:
             return self.method1_hierarchical_summarization(document, target_length)
 
-        cluster_sentences = {i: [] for i in range(n_clusters)}
-        sentence_order = []
-        for idx, (sent, cluster) in enumerate(zip(sentences, clusters)):
-            cluster_sentences[cluster].append(sent)
-            sentence_order.append((idx, cluster))
-
-        cluster_summaries = []
+        # Words per cluster from the per-sentence counts; a cluster's text is only joined if it is summarized
+        cluster_words = np.bincount(clusters, weights=analysis.word_counts, minlength=n_clusters)
+        cluster_summaries = {}
         for cluster_id in range(n_clusters):
-            cluster_text = ' '.join(cluster_sentences[cluster_id])
-            if len(cluster_text.split()) > 30:
+            word_count = int(cluster_words[cluster_id])
+            if word_count > 30:
+                cluster_text = ' '.join(analysis.sentences[i] for i in np.flatnonzero(clusters == cluster_id))
                 try:
-                    max_len = min(80, max(25, len(cluster_text.split()) // 2))
+                    max_len = min(80, max(25, word_count // 2))
                     min_len = min(10, max_len - 5)
                     summary = self.summarizer(cluster_text, max_length=max_len, min_length=min_len, do_sample=False)[0]['summary_text']
-                    cluster_summaries.append((cluster_id, summary))
+                    cluster_summaries[cluster_id] = summary
                 except Exception as e:
                     if self.debug:
                         print(f"Warning: Could not summarize cluster {cluster_id}: {e}")
-                    words = cluster_text.split()
-                    fallback = ' '.join(words[:30]) + "..." if len(words) > 30 else cluster_text
-                    cluster_summaries.append((cluster_id, fallback))
-
-        cluster_first_appearance = {}
-        for idx, cluster in sentence_order:
-            if cluster not in cluster_first_appearance:
-                cluster_first_appearance[cluster] = idx
+                    cluster_summaries[cluster_id] = ' '.join(cluster_text.split()[:30]) + "..."
 
-        sorted_clusters = sorted(cluster_first_appearance.items(), key=lambda x: x[1])
-        ordered_summaries = [summary for cid, _ in sorted_clusters for cid2, summary in cluster_summaries if cid == cid2]
+        # Clusters in the order they first appear in the document
+        cluster_ids, first_seen = np.unique(clusters, return_index=True)
+        ordered_summaries = [cluster_summaries[c] for c in cluster_ids[np.argsort(first_seen)] if c in cluster_summaries]
 
         combined = self._add_transitions(ordered_summaries)
         return self._direct_summarize(combined, target_length) if len(combined.split()) > target_length else combined
@@ -148,10 +197,8 @@ class AdvancedDocumentSummarizer:
         return ' '.join(result)
 
 
-# Example usage and comparison
-def compare_summarization_methods():
-    # Sample long document about Steve Jobs
-    document = """
+# Sample long document about Steve Jobs (also part of the benchmark corpus, bench/suite.py)
+SAMPLE_DOCUMENT = """
     Steven Paul Jobs was born on February 24, 1955, in San Francisco, California. He was adopted by Paul and Clara Jobs, who raised him in Mountain View, California, in the heart of what would later become known as Silicon Valley. From an early age, Jobs showed an interest in electronics and craftsmanship, often working with his adoptive father in the garage.
 
     In 1976, at the age of 21, Jobs co-founded Apple Computer Company with his friend Steve Wozniak in the famous garage of his childhood home. Their first product, the Apple I, was a revolutionary personal computer that helped launch the personal computer revolution. The success of the Apple II in 1977 made Apple one of the fastest-growing companies in history and established Jobs as a visionary leader in the technology industry.
@@ -170,9 +217,17 @@ def compare_summarization_methods():
 
     On October 5, 2011, Steve Jobs passed away at the age of 56, leaving behind a legacy that transformed multiple industries. His influence extended far beyond technology, affecting design, retail, entertainment, and corporate culture. Today, Apple continues to be one of the world's most valuable companies, and Jobs is remembered as one of the greatest innovators and entrepreneurs of the modern era.
     """
+
+
+# Example usage and comparison
+def compare_summarization_methods():
+    document = SAMPLE_DOCUMENT
     
     # Initialize summarizer
     summarizer = AdvancedDocumentSummarizer()
+    # Segment and embed once; methods 2 and 3 reuse this analysis
+    analysis = summarizer.analyze(document)
+    print(f"Analyzed {len(analysis.sentences)} sentences ({analysis.embeddings.shape[1]}-d embeddings)")
     
     print("=" * 80)
     print("COMPARING DIFFERENT SUMMARIZATION METHODS")
@@ -196,6 +251,16 @@ def compare_summarization_methods():
     summary3 = summarizer.method3_topic_aware_summarization(document, target_length=150)
     print(summary3)
     
+    # Method 4: Map-Reduce (in-process here; pass workers=N for a process pool)
+    print("\n📋 METHOD 4: MAP-REDUCE SUMMARIZATION")
+    print("-" * 50)
+    summary4 = summarizer.method4_map_reduce_summarization(document, target_length=150, workers=1)
+    print(summary4)
+    
+    print("\nLoaded models:")
+    for name, info in models.memory_report().items():
+        print(f"  {name}: {info['bytes'] / 2**20:.0f} MiB, loaded in {info['load_seconds']:.1f}s")
+    
     print("\n" + "=" * 80)
     print("ANALYSIS COMPLETE - Choose the method that works best for your use case!")
     print("=" * 80)
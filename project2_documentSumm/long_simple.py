@@ -1,42 +1,85 @@
-from transformers import pipeline, AutoTokenizer
-import torch
 import re
+from functools import partial
+
+import models
+from chunking import TokenChunker
+from mapreduce import reduce_summaries, summarize_texts
+from profiling import Timed
+from streaming import iter_chunks, read_blocks, stream_summaries
+from summary_cache import with_cache
+
+WHITESPACE = re.compile(r'\s+')
+SPECIAL_CHARS = re.compile(r'[^\w\s.,!?;:()-]')
 
 class SimpleRobustSummarizer:
-    def __init__(self, model_name="facebook/bart-large-cnn"):
-        self.device = 0 if torch.cuda.is_available() else -1
-        self.summarizer = pipeline('summarization', model=model_name, device=self.device)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+    def __init__(self, model_name="facebook/bart-large-cnn", batch_size=8, cache=None, backend=None):
+        self.model_name = model_name
+        # 'torch' (default), or 'int8' / 'onnx' for faster CPU inference (see models.summarization_pipeline)
+        self.backend = backend
+        # cache: a SummaryCache or the path of one; unchanged chunks are then never re-summarized
+        self.cache = cache
         self.max_input_length = 1024  # BART's max input length
+        self.batch_size = batch_size  # chunks per forward pass (1 = one chunk at a time)
+        # The pipeline and tokenizer come from the shared model registry on first use
+        self._summarizer = None
+        self._chunker = None
+    
+    @property
+    def summarizer(self):
+        if self._summarizer is None:
+            self._summarizer = with_cache(
+                Timed(models.summarization_pipeline(self.model_name, backend=self.backend), 'generation'),
+                self.cache, models.backend_name(self.model_name, self.backend)
+            )
+        return self._summarizer
+    
+    @property
+    def tokenizer(self):
+        return models.tokenizer(self.model_name)
+    
+    @property
+    def chunker(self):
+        if self._chunker is None:
+            self._chunker = TokenChunker(self.tokenizer, self.max_input_length)
+        return self._chunker
         
-    def smart_chunk_summarization(self, document, target_length=200):
+    def smart_chunk_summarization(self, document, target_length=200, batch_size=None):
         """
         Improved chunking that maintains context and narrative flow
+        
+        batch_size overrides the instance default; with more than 1 the chunks
+        are summarized in padded batches instead of one forward pass each.
         """
+        batch_size = batch_size or self.batch_size
         # Clean the document
         document = self._clean_text(document)
         
-        # Check if document is short enough for direct summarization
-        word_count = len(document.split())
-        if word_count <= 400:
-            return self._safe_summarize(document, target_length)
-        
-        # Split into sentences for better boundary detection
-        sentences = self._split_into_sentences(document)
+        # One tokenizer pass; token and word counts of any span are then binary searches
+        segmentation = self.chunker.segment(document)
+        if len(segmentation.token_starts) <= self.chunker.max_tokens:
+            return self._safe_summarize(document, target_length, segmentation.words())
         
-        # Create overlapping chunks that respect sentence boundaries
-        chunks = self._create_smart_chunks(sentences)
+        # Overlapping chunks of whole sentences, each filling the window as far as it can
+        spans = self.chunker.chunk_spans(document, starts=segmentation.token_starts)
+        word_counts = [segmentation.words(start, end) for start, end, _ in spans]
+        # Strings are only made for the text that goes to the model
+        chunks = [document[start:end] for start, end, _ in spans]
         
         if len(chunks) == 1:
-            return self._safe_summarize(chunks[0], target_length)
+            return self._safe_summarize(chunks[0], target_length, word_counts[0])
         
         # Summarize each chunk
-        chunk_summaries = []
-        for i, chunk in enumerate(chunks):
-            print(f"Processing chunk {i+1}/{len(chunks)}...")
-            summary = self._safe_summarize(chunk, target_length // len(chunks) + 50)
-            if summary:
-                chunk_summaries.append(summary)
+        chunk_target = target_length // len(chunks) + 50
+        if batch_size > 1:
+            print(f"Processing {len(chunks)} chunks in batches of {batch_size}...")
+            chunk_summaries = [s for s in self._batch_summarize(chunks, chunk_target, batch_size, word_counts) if s]
+        else:
+            chunk_summaries = []
+            for i, chunk in enumerate(chunks):
+                print(f"Processing chunk {i+1}/{len(chunks)}...")
+                summary = self._safe_summarize(chunk, chunk_target, word_counts[i])
+                if summary:
+                    chunk_summaries.append(summary)
         
         # Combine summaries with improved transitions
         if not chunk_summaries:
@@ -44,74 +87,102 @@ class SimpleRobustSummarizer:
         
         combined = self._combine_with_transitions(chunk_summaries)
         
+        # Book-length input: the chunk summaries alone overflow the window, so reduce them level by level
+        if self.chunker.count(combined) > self.chunker.max_tokens:
+            return reduce_summaries(partial(self._run_batch, batch_size=batch_size), self.chunker, chunk_summaries, target_length)
+        
         # Final pass if the combined summary is still too long
         if len(combined.split()) > target_length * 1.2:
             combined = self._safe_summarize(combined, target_length)
         
         return combined
     
+    def summarize_file(self, path, target_length=200, batch_size=None, block_size=256 * 1024):
+        """
+        Summarize a text file of any size without loading it into memory
+        
+        Generator: yields {'stage': 'chunk', ...} as chunk summaries complete,
+        {'stage': 'reduce', ...} as they are merged, and {'stage': 'final',
+        'summary': ...} last (see streaming.stream_summaries).
+        """
+        chunks = iter_chunks(read_blocks(path, block_size), self.chunker, clean=self._clean_text)
+        batch_size = batch_size or self.batch_size
+        run = partial(self._run_batch, batch_size=batch_size)
+        yield from stream_summaries(chunks, run, self.chunker, target_length, batch_size)
+    
     def _clean_text(self, text):
         """Clean and normalize text"""
         # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text.strip())
-        # Remove any special characters that might cause issues
-        text = re.sub(r'[^\w\s.,!?;:()-]', '', text)
+        text = WHITESPACE.sub(' ', text).strip()
+        # Remove any special characters that might cause issues (most text has none: no copy then)
+        if SPECIAL_CHARS.search(text):
+            text = SPECIAL_CHARS.sub('', text)
         return text
     
-    def _split_into_sentences(self, text):
-        """Simple sentence splitting that works without NLTK"""
-        # Split on sentence endings, but be careful with abbreviations
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        
-        # Clean up sentences
-        cleaned_sentences = []
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if len(sentence) > 10:  # Filter out very short fragments
-                cleaned_sentences.append(sentence)
-        
-        return cleaned_sentences
-    
-    def _create_smart_chunks(self, sentences):
-        """Create chunks that respect sentence boundaries and maintain context"""
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        target_chunk_size = 300  # words per chunk
-        overlap_sentences = 2  # sentences to overlap between chunks
-        
-        for i, sentence in enumerate(sentences):
-            sentence_length = len(sentence.split())
-            
-            # If adding this sentence would exceed our target, start a new chunk
-            if current_length + sentence_length > target_chunk_size and current_chunk:
-                chunk_text = ' '.join(current_chunk)
-                chunks.append(chunk_text)
-                
-                # Start new chunk with overlap from previous chunk
-                if len(current_chunk) > overlap_sentences:
-                    current_chunk = current_chunk[-overlap_sentences:]
-                    current_length = sum(len(s.split()) for s in current_chunk)
-                else:
-                    current_chunk = []
-                    current_length = 0
-            
-            current_chunk.append(sentence)
-            current_length += sentence_length
+    def _length_limits(self, word_count, target_length):
+        """Safe (max_length, min_length) for a text of word_count words"""
+        max_length = min(target_length, max(20, word_count // 2))
+        min_length = min(10, max_length - 5)
+        
+        # Ensure min_length is less than max_length
+        if min_length >= max_length:
+            min_length = max(1, max_length - 5)
+        return max_length, min_length
+    
+    def _run_batch(self, texts, max_length, min_length, batch_size=None):
+        return summarize_texts(self.summarizer, texts, max_length, min_length, max(1, batch_size or self.batch_size))
+    
+    def _batch_summarize(self, texts, target_length, batch_size, word_counts=None):
+        """Summarize many texts in padded batches; returns summaries in input order
         
-        # Add the last chunk if it has content
-        if current_chunk:
-            chunk_text = ' '.join(current_chunk)
-            chunks.append(chunk_text)
+        Texts needing the same length limits are grouped and sorted by length, so
+        each batch pads to similar sizes. If a batch fails, its texts are retried
+        one by one through _safe_summarize, so one bad chunk cannot sink the rest.
+        word_counts, when known, saves re-splitting every text to count it.
+        """
+        results = [""] * len(texts)
+        groups = {}
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            word_count = word_counts[i] if word_counts else len(text.split())
+            if word_count <= target_length:
+                results[i] = text
+                continue
+            limits = self._length_limits(word_count, target_length)
+            groups.setdefault(limits, []).append((word_count, i))
         
-        return chunks
+        for (max_length, min_length), members in groups.items():
+            members.sort()
+            for start in range(0, len(members), batch_size):
+                indices = [i for _, i in members[start:start + batch_size]]
+                try:
+                    outputs = self.summarizer(
+                        [texts[i] for i in indices],
+                        max_length=max_length,
+                        min_length=min_length,
+                        do_sample=False,
+                        clean_up_tokenization_spaces=True,
+                        batch_size=len(indices)
+                    )
+                    for i, output in zip(indices, outputs):
+                        results[i] = output['summary_text']
+                except Exception as e:
+                    print(f"Batch summarization error, retrying chunks one by one: {e}")
+                    for i in indices:
+                        results[i] = self._safe_summarize(
+                            texts[i], target_length, word_counts[i] if word_counts else None
+                        )
+        
+        return results
     
-    def _safe_summarize(self, text, target_length):
+    def _safe_summarize(self, text, target_length, word_count=None):
         """Safely summarize text with proper error handling"""
         if not text or not text.strip():
             return ""
         
-        word_count = len(text.split())
+        if word_count is None:
+            word_count = len(text.split())
         
         # If text is already shorter than target, return as-is
         if word_count <= target_length:
@@ -119,12 +190,7 @@ class SimpleRobustSummarizer:
         
         try:
             # Calculate safe min/max lengths
-            max_length = min(target_length, max(20, word_count // 2))
-            min_length = min(10, max_length - 5)
-            
-            # Ensure min_length is less than max_length
-            if min_length >= max_length:
-                min_length = max(1, max_length - 5)
+            max_length, min_length = self._length_limits(word_count, target_length)
             
             result = self.summarizer(
                 text,
@@ -0,0 +1,186 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import models
+from chunking import TokenChunker
+from profiling import Timed
+from summary_cache import SummaryCache, with_cache
+
+
+def summarize_texts(summarizer, texts, max_length, min_length, batch_size=4):
+    """Summarize `texts` in batches; a failing batch is retried text by text"""
+    min_length = max(1, min(min_length, max_length - 5))
+    results = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        if len(text.split()) <= max_length:
+            results[i] = text  # already short enough, nothing to gain from the model
+        else:
+            pending.append(i)
+
+    for start in range(0, len(pending), batch_size):
+        indices = pending[start:start + batch_size]
+        batch = [texts[i] for i in indices]
+        try:
+            outputs = summarizer(
+                batch, max_length=max_length, min_length=min_length, do_sample=False,
+                truncation=True, batch_size=len(batch)
+            )
+            for i, output in zip(indices, outputs):
+                results[i] = output['summary_text']
+        except Exception as e:
+            print(f"Batch summarization error, retrying one by one: {e}")
+            for i in indices:
+                try:
+                    results[i] = summarizer(
+                        texts[i], max_length=max_length, min_length=min_length, do_sample=False, truncation=True
+                    )[0]['summary_text']
+                except Exception as e:
+                    print(f"Summarization error: {e}")
+                    words = texts[i].split()
+                    results[i] = ' '.join(words[:max_length]) + "..."
+    return results
+
+
+def reduce_summaries(run, chunker, summaries, target_length, fan_in=4, max_depth=5, summary_length=150, levels=None):
+    """Reduce summaries level by level until they fit the model window, then summarize once more
+
+    `run(texts, max_length, min_length)` summarizes a list of texts (in-process or
+    on a worker pool). Each level joins up to `fan_in` consecutive summaries per
+    group, as long as the group fits the window, so the tree has about
+    log_fan_in(chunks) levels. After `max_depth` levels the remaining text is
+    truncated to the window rather than reduced further.
+    """
+    depth = 1
+    texts = [s for s in summaries if s]
+    while True:
+        combined = ' '.join(texts)
+        if chunker.count(combined) <= chunker.max_tokens or len(texts) <= 1:
+            break
+        if depth >= max_depth:
+            print(f"Reached max depth {max_depth}; final pass truncates the remaining text")
+            break
+
+        started = time.perf_counter()
+        groups, current, used = [], [], 0
+        for text in texts:
+            n = chunker.count(text)
+            if current and (len(current) >= fan_in or used + n > chunker.max_tokens):
+                groups.append(' '.join(current))
+                current, used = [], 0
+            current.append(text)
+            used += n
+        groups.append(' '.join(current))
+
+        texts = run(groups, summary_length, min(30, summary_length // 2))
+        if levels is not None:
+            levels.append({'level': depth, 'inputs': len(groups), 'outputs': len(texts),
+                           'seconds': time.perf_counter() - started})
+        depth += 1
+
+    started = time.perf_counter()
+    final = run([combined], target_length, target_length // 2)[0]
+    if levels is not None:
+        levels.append({'level': depth, 'inputs': 1, 'outputs': 1, 'seconds': time.perf_counter() - started})
+    return final
+
+
+# Per-process pipeline for pool workers
+_worker_summarizer = None
+
+
+def _init_worker(model_name, threads, cache_path=None, backend=None):
+    global _worker_summarizer
+    import torch
+    torch.set_num_threads(threads)
+    _worker_summarizer = with_cache(
+        models.summarization_pipeline(model_name, backend=backend), cache_path, models.backend_name(model_name, backend)
+    )
+
+
+def _worker_summarize(texts, max_length, min_length, batch_size):
+    return summarize_texts(_worker_summarizer, texts, max_length, min_length, batch_size)
+
+
+class MapReduceSummarizer:
+    """Recursive map-reduce summarization for documents far beyond the model window
+
+    The document is cut into window-sized chunks (map), then summaries are
+    reduced in groups of `fan_in` until they fit one window. Every level's
+    summaries run on a process pool, one model per worker; on CPU hosts the
+    cores are split between workers (`torch.set_num_threads`) so they do not
+    oversubscribe. `levels` holds the timing of each level of the last run.
+    `cache` (a SummaryCache or its path) is shared by all workers.
+    """
+
+    def __init__(self, model_name="facebook/bart-large-cnn", workers=None, fan_in=4, max_depth=5,
+                 summary_length=150, batch_size=4, tokenizer=None, summarizer=None, cache=None, backend=None):
+        self.model_name = model_name
+        self.backend = backend
+        self.fan_in = max(2, fan_in)
+        self.max_depth = max_depth
+        self.summary_length = summary_length
+        self.batch_size = batch_size
+        self.levels = []
+        self.chunker = TokenChunker(tokenizer or models.tokenizer(model_name))
+
+        cpus = os.cpu_count() or 1
+        if workers is None:
+            # One GPU is best driven by one process; on CPU, BART needs ~2 GB and a few cores per worker
+            on_gpu = (backend or models.DEFAULT_BACKEND) == 'torch' and models.default_device() >= 0
+            workers = 1 if on_gpu else max(1, min(4, cpus // 2))
+        self.workers = workers
+        self._summarizer = summarizer
+        self._pool = None
+        if workers > 1:
+            if (backend or models.DEFAULT_BACKEND) == 'onnx':
+                models.export_onnx(model_name)  # here, so the workers only load it
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_name, max(1, cpus // workers),
+                          cache.path if isinstance(cache, SummaryCache) else cache, backend),
+            )
+        elif summarizer is None:
+            # Shared with any other summarizer in this process through the model registry
+            self._summarizer = with_cache(
+                Timed(models.summarization_pipeline(model_name, backend=backend), 'generation'),
+                cache, models.backend_name(model_name, backend)
+            )
+
+    def _run(self, texts, max_length, min_length):
+        if self._pool is None:
+            return summarize_texts(self._summarizer, texts, max_length, min_length, self.batch_size)
+        # Spread the level over the workers in small batches, keeping input order
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = self._pool.map(
+            _worker_summarize, batches,
+            [max_length] * len(batches), [min_length] * len(batches), [self.batch_size] * len(batches)
+        )
+        return [summary for batch in results for summary in batch]
+
+    def summarize(self, document, target_length=200):
+        self.levels = []
+        started = time.perf_counter()
+        chunks = self.chunker.chunk(document)
+        summaries = self._run(chunks, self.summary_length, 30) if len(chunks) > 1 else chunks
+        self.levels.append({'level': 0, 'inputs': len(chunks), 'outputs': len(summaries),
+                            'seconds': time.perf_counter() - started})
+        return reduce_summaries(
+            self._run, self.chunker, summaries, target_length,
+            fan_in=self.fan_in, max_depth=self.max_depth, summary_length=self.summary_length, levels=self.levels
+        )
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,249 @@
+"""Process-wide registry of loaded models
+
+Nothing is imported or loaded until a model is first asked for, so importing
+the summarizer modules (and constructing the summarizer classes) is cheap.
+Each model is loaded once per process, under its own lock, and shared by every
+instance that asks for it; concurrent first requests wait for the same load.
+Because they are shared, models are handed out wrapped in `Serialized`, so
+threads take turns calling them.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Inference backends for the summarization pipeline (see summarization_pipeline)
+BACKENDS = ('torch', 'int8', 'onnx')
+DEFAULT_BACKEND = os.getenv('SUMMARIZER_BACKEND', 'torch')
+# Models exported to ONNX are kept here and reused by every later process
+ONNX_DIR = os.getenv('SUMMARIZER_ONNX_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'summarizer', 'onnx'))
+
+
+def default_device():
+    """0 (first GPU) when CUDA is available, else -1 (CPU)"""
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
+
+def _parameter_bytes(module):
+    """Bytes held by a torch module's weights (0 for anything else, e.g. an ONNX Runtime session)"""
+    if module is None or not hasattr(module, 'state_dict'):
+        return 0
+    seen, total = set(), 0
+    pending = list(module.state_dict().values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            # Dynamically quantized Linear layers store (int8 weight, bias) pairs
+            pending.extend(value)
+        elif hasattr(value, 'element_size') and value.data_ptr() not in seen:
+            seen.add(value.data_ptr())  # tied weights (shared embeddings) count once
+            total += value.numel() * value.element_size()
+    return total
+
+
+class Serialized:
+    """Proxy that lets one thread at a time call the wrapped model
+
+    HF pipelines and fast (Rust) tokenizers are not thread-safe: every call
+    re-applies truncation and padding settings to the shared tokenizer, so
+    concurrent calls can fail with "Already borrowed" or run with each other's
+    settings. `__call__` and the `methods` named are made under `lock`; any
+    other attribute comes straight from the wrapped object.
+    """
+
+    def __init__(self, wrapped, lock, methods=()):
+        self.wrapped = wrapped
+        self.lock = lock
+        self.methods = methods
+
+    def __getattr__(self, attr):
+        value = getattr(self.wrapped, attr)
+        if attr not in self.methods:
+            return value
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return value(*args, **kwargs)
+        return locked
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.wrapped(*args, **kwargs)
+
+
+_model_locks = {}
+_model_locks_lock = threading.Lock()
+
+
+def _model_lock(model_name):
+    """One lock per model name, shared by its pipeline and its tokenizer (which the pipeline also uses)"""
+    with _model_locks_lock:
+        return _model_locks.setdefault(model_name, threading.RLock())
+
+
+_TOKENIZER_METHODS = ('num_special_tokens_to_add', 'encode', 'decode')
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+        self._info = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, module=None):
+        """The model stored under `key`, calling `loader()` the first time
+
+        `module(model)` returns the torch module to measure for memory_report().
+        """
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            model = self._models.get(key)
+            if model is None:
+                started = time.perf_counter()
+                model = loader()
+                seconds = time.perf_counter() - started
+                self._info[key] = {
+                    'bytes': _parameter_bytes(module(model) if module else model),
+                    'load_seconds': seconds,
+                }
+                self._models[key] = model
+        return model
+
+    def loaded(self, key):
+        return key in self._models
+
+    def items(self):
+        return list(self._models.items())
+
+    def unload(self, key):
+        with self._lock:
+            self._models.pop(key, None)
+            self._info.pop(key, None)
+
+    def memory_report(self):
+        """{key: {'bytes': ..., 'load_seconds': ...}} for every loaded model"""
+        return {'/'.join(str(k) for k in key): dict(info) for key, info in self._info.items()}
+
+
+registry = ModelRegistry()
+
+
+def backend_name(model_name, backend=None):
+    """Model name qualified by a non-default backend, e.g. for cache keys (int8 output differs slightly)"""
+    backend = backend or DEFAULT_BACKEND
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+
+def _load_int8(model_name):
+    """fp32 pipeline with every nn.Linear swapped for a dynamically quantized int8 one"""
+    import torch
+    from transformers import pipeline
+    summarizer = pipeline('summarization', model=model_name, device=-1)
+    summarizer.model = torch.quantization.quantize_dynamic(
+        summarizer.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    return summarizer
+
+
+def _ort_seq2seq():
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise ImportError("The onnx backend needs onnxruntime and optimum: pip install optimum[onnxruntime]") from e
+    return ORTModelForSeq2SeqLM
+
+
+def export_onnx(model_name):
+    """Directory holding `model_name` exported to ONNX (with its tokenizer), exporting it on first use
+
+    The export is written to a temporary directory and renamed into place, so
+    processes exporting at the same time never load a half-written model.
+    """
+    path = os.path.join(ONNX_DIR, model_name.replace('/', '--'))
+    if os.path.isdir(path):
+        return path
+    model_class = _ort_seq2seq()
+    from transformers import AutoTokenizer
+    os.makedirs(ONNX_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.export-', dir=ONNX_DIR)
+    try:
+        print(f"Exporting {model_name} to ONNX in {path} (once)...")
+        model_class.from_pretrained(model_name, export=True).save_pretrained(staging)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(staging)
+        try:
+            os.rename(staging, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+            # another process finished the same export first
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return path
+
+
+def _load_onnx(model_name):
+    """Pipeline over the exported ONNX model, run by ONNX Runtime (needs `optimum`)"""
+    path = export_onnx(model_name)
+    from transformers import AutoTokenizer, pipeline
+    model = _ort_seq2seq().from_pretrained(path)
+    return pipeline('summarization', model=model, tokenizer=AutoTokenizer.from_pretrained(path))
+
+
+def summarization_pipeline(model_name="facebook/bart-large-cnn", device=None, backend=None):
+    """The shared summarization pipeline for `model_name` on `backend`
+
+    'torch' is the plain fp32 (or GPU) pipeline. 'int8' and 'onnx' are CPU
+    backends for hosts without a GPU: dynamic int8 quantization of the Linear
+    layers, or the exported graph on ONNX Runtime. All three are called the
+    same way and return the same output shape.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    device = -1 if backend != 'torch' else default_device() if device is None else device
+
+    def load():
+        from transformers import pipeline
+        from transformers.utils import logging
+        logging.set_verbosity_error()
+        if backend == 'int8':
+            summarizer = _load_int8(model_name)
+        elif backend == 'onnx':
+            summarizer = _load_onnx(model_name)
+        else:
+            summarizer = pipeline('summarization', model=model_name, device=device)
+        return Serialized(summarizer, _model_lock(model_name))
+
+    return registry.get(('summarization', model_name, device, backend), load, module=lambda p: p.model)
+
+
+def tokenizer(model_name="facebook/bart-large-cnn"):
+    """The model's tokenizer; reuses a loaded pipeline's instead of loading a second copy"""
+    for key, model in registry.items():
+        if key[:2] == ('summarization', model_name):
+            return Serialized(model.tokenizer, _model_lock(model_name), _TOKENIZER_METHODS)
+
+    def load():
+        from transformers import AutoTokenizer
+        return Serialized(AutoTokenizer.from_pretrained(model_name), _model_lock(model_name), _TOKENIZER_METHODS)
+
+    return registry.get(('tokenizer', model_name), load)
+
+
+def sentence_model(model_name='all-MiniLM-L6-v2'):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return Serialized(SentenceTransformer(model_name), _model_lock(('sentence', model_name)), ('encode',))
+
+    return registry.get(('sentence', model_name), load)
+
+
+def memory_report():
+    return registry.memory_report()
@@ -0,0 +1,64 @@
+"""Opt-in wall-time accounting per pipeline stage
+
+The summarizers mark their stages with `stage('embedding')` etc. Outside a
+`collect()` block that costs one check; inside it, seconds and calls per
+stage are added up (across threads), e.g. for the benchmark suite:
+
+    with profiling.collect() as timings:
+        summarizer.method3_topic_aware_summarization(document)
+    timings  # {'segmentation': {'seconds': ..., 'calls': ...}, 'embedding': ...}
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_active = None
+_lock = threading.Lock()
+
+
+@contextmanager
+def stage(name):
+    if _active is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def record(name, seconds):
+    timings = _active
+    if timings is None:
+        return
+    with _lock:
+        entry = timings.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+
+
+@contextmanager
+def collect():
+    """Collect stage timings until the block exits; yields the dict being filled"""
+    global _active
+    previous, _active = _active, {}
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+class Timed:
+    """Wraps a callable (e.g. a summarization pipeline) so every call counts towards `name`"""
+
+    def __init__(self, wrapped, name='generation'):
+        self.wrapped = wrapped
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self.wrapped, attr)
+
+    def __call__(self, *args, **kwargs):
+        with stage(self.name):
+            return self.wrapped(*args, **kwargs)
@@ -0,0 +1,117 @@
+import codecs
+import mmap
+import os
+
+from mapreduce import reduce_summaries
+
+
+def read_blocks(path, block_size=256 * 1024, encoding='utf-8', use_mmap=True):
+    """Yield the text of the file at `path` in blocks of about `block_size` bytes
+
+    With `use_mmap` the file is memory-mapped, so the OS pages it in and out
+    instead of the process holding it; otherwise it is read with buffered I/O.
+    Multi-byte characters split across blocks are decoded correctly either way.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    with open(path, 'rb') as f:
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, len(mapped), block_size):
+                    text = decoder.decode(mapped[start:start + block_size])
+                    if text:
+                        yield text
+        else:
+            while True:
+                data = f.read(block_size)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_chunks(blocks, chunker, clean=None):
+    """Chunk text arriving in `blocks` with `chunker`, holding only about one block at a time
+
+    Each round the buffer (the unfinished end of the previous block plus the
+    next block) is chunked; every chunk but the last is emitted and the last
+    one, which may end in a cut sentence, starts the next buffer. Chunks are
+    the same sentence-packed, overlapping chunks `chunker.chunk_spans` makes
+    for a whole document.
+    """
+    buffer = ''
+    for block in blocks:
+        if clean is not None:
+            # Keep the whitespace at block edges so words on either side do not run together
+            cleaned = clean(block)
+            block = (' ' if block[:1].isspace() else '') + cleaned + (' ' if block[-1:].isspace() else '')
+        buffer += block
+        spans = chunker.chunk_spans(buffer)
+        for start, end, _ in spans[:-1]:
+            yield buffer[start:end]
+        if len(spans) > 1:
+            buffer = buffer[spans[-1][0]:]
+    if buffer.strip():
+        for start, end, _ in chunker.chunk_spans(buffer):
+            yield buffer[start:end]
+
+
+def stream_summaries(chunks, run, chunker, target_length=200, batch_size=4, fan_in=4, summary_length=150):
+    """Summarize `chunks` as they arrive; yields progress events, then the final summary
+
+    Events are dicts: {'stage': 'chunk', 'index', 'summary'} for every chunk
+    summary as soon as its batch finishes, {'stage': 'reduce', 'level',
+    'inputs'} whenever summaries are merged, and finally {'stage': 'final',
+    'summary', 'chunks'}. Summaries are merged online, a group of up to
+    `fan_in` (or one window's worth) at a time, so only a few summaries per
+    level are ever held and memory does not grow with the input.
+    """
+    min_length = min(30, summary_length // 2)
+    levels = [[]]  # levels[i]: summaries of the text so far, i merges deep, oldest first
+
+    def push(level, summary):
+        if level == len(levels):
+            levels.append([])
+        pending = levels[level]
+        pending.append(summary)
+        joined = ' '.join(pending)
+        if len(pending) >= fan_in or chunker.count(joined) > chunker.max_tokens:
+            if len(pending) > 1 and chunker.count(joined) > chunker.max_tokens:
+                # The newest one overflowed the window: merge the others and start over from it
+                group, levels[level] = pending[:-1], pending[-1:]
+            else:
+                group, levels[level] = pending, []
+            if len(group) == 1:
+                # Nothing to merge it with; it moves up as it is
+                yield from push(level + 1, group[0])
+                return
+            yield {'stage': 'reduce', 'level': level + 1, 'inputs': len(group)}
+            merged = run([' '.join(group)], summary_length, min_length)[0]
+            yield from push(level + 1, merged)
+
+    count = 0
+    batch = []
+
+    def flush():
+        nonlocal count
+        for summary in run(batch, summary_length, min_length):
+            yield {'stage': 'chunk', 'index': count, 'summary': summary}
+            count += 1
+            yield from push(0, summary)
+        batch.clear()
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield from flush()
+    if batch:
+        yield from flush()
+
+    # Deeper levels cover earlier text, so read them from the top down
+    remaining = [s for level in reversed(levels) for s in level if s]
+    final = reduce_summaries(run, chunker, remaining, target_length, fan_in=fan_in,
+                             summary_length=summary_length) if remaining else ''
+    yield {'stage': 'final', 'summary': final, 'chunks': count}
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import xxhash
+
+# Pipeline arguments that do not change the generated text
+_IGNORED_PARAMS = {'batch_size'}
+
+
+class SummaryCache:
+    """Persistent, content-addressed store of generated summaries
+
+    Entries are keyed by a hash of the model, the generation parameters and the
+    exact input text, so an edited document only misses on the chunks whose text
+    changed (and on the reduce steps above them, whose inputs changed). The
+    SQLite file can be shared by several processes. When it grows past
+    `max_entries` or `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path="summary_cache.sqlite", max_entries=100_000, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries "
+            "(key TEXT PRIMARY KEY, summary TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def key(model, params, text):
+        params = {k: v for k, v in params.items() if k not in _IGNORED_PARAMS}
+        h = xxhash.xxh3_128()
+        h.update(model.encode('utf-8'))
+        h.update(b'\0' + json.dumps(params, sort_keys=True, default=str).encode('utf-8') + b'\0')
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def get_many(self, keys):
+        """{key: summary} for the keys present; refreshes their recency"""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, summary FROM summaries WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE summaries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Store (key, summary) pairs, then evict if over the limits"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO summaries (key, summary, size, last_used) VALUES (?, ?, ?, ?)",
+                [(k, s, len(s.encode('utf-8')), now) for k, s in items],
+            )
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries").fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+        # Drop the oldest tenth (at least enough to get under the entry limit) in one statement
+        excess = max(entries - self.max_entries, entries // 10, 1)
+        self._db.execute(
+            "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self._db.commit()
+        self.evictions += excess
+        self._evict()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries").fetchone()
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries,
+            'bytes': size,
+            'evictions': self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachedSummarizer:
+    """Drop-in wrapper around a summarization pipeline that consults a SummaryCache
+
+    Called like the pipeline (a string or a list of strings plus generation
+    kwargs) and returns the same [{'summary_text': ...}] shape. Only the texts
+    missing from the cache reach the model, in one call; failures are not cached.
+    """
+
+    def __init__(self, summarizer, cache, model_name):
+        self.summarizer = summarizer
+        self.cache = cache
+        self.model_name = model_name
+
+    def __getattr__(self, name):
+        # Everything else (tokenizer, model, device, ...) comes from the wrapped pipeline
+        return getattr(self.summarizer, name)
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        keys = [self.cache.key(self.model_name, kwargs, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        if missing:
+            # Identical texts in one call are generated once
+            unique = list(dict.fromkeys(keys[i] for i in missing))
+            first = {}
+            for i in missing:
+                first.setdefault(keys[i], texts[i])
+            outputs = self.summarizer([first[k] for k in unique], **kwargs)
+            generated = {k: out['summary_text'] for k, out in zip(unique, outputs)}
+            self.cache.put_many(list(generated.items()))
+            found.update(generated)
+
+        return [{'summary_text': found[key]} for key in keys]
+
+
+def with_cache(summarizer, cache, model_name):
+    """Wrap `summarizer` when `cache` is a SummaryCache or a path to one; otherwise return it as is"""
+    if cache is None or cache is False:
+        return summarizer
+    if not isinstance(cache, SummaryCache):
+        cache = SummaryCache(cache)
+    return CachedSummarizer(summarizer, cache, model_name)
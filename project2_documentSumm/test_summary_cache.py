@@ -0,0 +1,76 @@
+import random
+import re
+
+from chunking import TokenChunker
+from summary_cache import CachedSummarizer, SummaryCache
+
+WORDS = "the council approved plan for new solar farm rail line harbour school budget flood river bridge library".split()
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word, with offsets like a fast tokenizer"""
+
+    model_max_length = 1024
+
+    def __call__(self, text, **kwargs):
+        return {'offset_mapping': [m.span() for m in re.finditer(r'\S+', text)]}
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+
+class CountingSummarizer:
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, texts, **kwargs):
+        self.inputs.extend(texts)
+        return [{'summary_text': text[:40]} for text in texts]
+
+
+def document(paragraphs=120, seed=0):
+    rng = random.Random(seed)
+    return [
+        ' '.join(' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))).capitalize() + '.'
+                 for _ in range(rng.randint(3, 7)))
+        for _ in range(paragraphs)
+    ]
+
+
+def regenerated_after_edits(tmp_path, paragraphs):
+    """(chunks of the document, [(chunks after an edit, texts the model was run on)] for edits across it)"""
+    chunker = TokenChunker(WordTokenizer(), max_tokens=138)
+    original = document()
+    before = chunker.chunk('\n\n'.join(original), paragraphs=paragraphs)
+    runs = []
+    for position in range(5, len(original), 12):
+        model = CountingSummarizer()
+        summarizer = CachedSummarizer(model, SummaryCache(str(tmp_path / f'cache{position}.sqlite')), 'test-model')
+        summarizer(before, max_length=60)
+
+        edited = list(original)
+        edited[position] += ' An added sentence changes the token count of this paragraph' + ' a lot' * 12 + '.'
+        after = chunker.chunk('\n\n'.join(edited), paragraphs=paragraphs)
+        model.inputs.clear()
+        summarizer(after, max_length=60)
+        runs.append((after, model.inputs))
+    return before, runs
+
+
+def check_untouched_chunks_hit(before, runs, max_mean):
+    for after, regenerated in runs:
+        # Every chunk whose text is unchanged is a hit; only changed ones reach the model
+        assert regenerated == [chunk for chunk in after if chunk not in set(before)]
+        assert 0 < len(regenerated) < len(after) // 2
+    # An edit only moves chunk boundaries up to the next cut point, not to the end of the document
+    assert sum(len(regenerated) for _, regenerated in runs) / len(runs) <= max_mean
+
+
+def test_edit_reruns_only_affected_sentence_chunks(tmp_path):
+    before, runs = regenerated_after_edits(tmp_path, paragraphs=False)
+    check_untouched_chunks_hit(before, runs, max_mean=8)
+
+
+def test_edit_reruns_only_affected_paragraph_chunks(tmp_path):
+    before, runs = regenerated_after_edits(tmp_path, paragraphs=True)
+    check_untouched_chunks_hit(before, runs, max_mean=4)